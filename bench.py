@@ -0,0 +1,505 @@
+#!/usr/bin/env python
+
+"""Micro benchmarks for cctool.
+
+Run ``python bench.py`` to run all benchmarks or ``python bench.py NAME`` to
+run a single one.  Each benchmark compares the current implementation to a
+copy of the previous one where that makes sense.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from datetime import datetime
+from io import BytesIO
+from timeit import default_timer
+import argparse
+import base64
+import codecs
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+try:  # pragma: nocover
+	from ConfigParser import RawConfigParser as ConfigParser
+except ImportError:  # pragma: nocover
+	from configparser import RawConfigParser as ConfigParser
+
+try:
+	import tracemalloc
+except ImportError:  # pragma: nocover
+	tracemalloc = None
+
+import cctool
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(fn):
+	BENCHMARKS[fn.__name__[len('bench_'):]] = fn
+	return fn
+
+
+def measure(label, fn, *args):
+	"""Print wall time and peak memory of `fn`.
+
+	The function is called twice because tracing memory allocations slows
+	down execution considerably.  `args` must therefore be reusable.
+	"""
+	start = default_timer()
+	result = fn(*args)
+	duration = default_timer() - start
+	if tracemalloc is not None:
+		del result
+		tracemalloc.start()
+		result = fn(*args)
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+		print('%-30s %8.3fs %10.1f MiB' % (label, duration, peak / 2.0 ** 20))
+	else:  # pragma: nocover
+		print('%-30s %8.3fs' % (label, duration))
+	return result
+
+
+class LegacyMultiDict(OrderedDict):
+	"""MultiDict as of cctool 0.1.1."""
+
+	def __contains__(self, key):
+		return (super(LegacyMultiDict, self).__contains__(key) and
+			super(LegacyMultiDict, self).__getitem__(key) != [])
+
+	def __getitem__(self, key):
+		if key in self:
+			return super(LegacyMultiDict, self).__getitem__(key)
+		else:
+			return []
+
+	def append(self, key, values):
+		for value in values:
+			if value not in self[key]:
+				self[key] = self[key] + [value]
+
+
+def _many_dicts(cls, n):
+	return [cls([('name', ['foo']), ('email', ['foo@example.com'])])
+		for i in range(n)]
+
+
+def _many_appended(cls, n):
+	items = []
+	for i in range(n):
+		d = cls()
+		d.append('name', ['name %i' % i])
+		d.append('email', ['%i@example.com' % i])
+		d.append('phone', ['555 %i' % i])
+		d.append('tag', ['a', 'b'])
+		items.append(d)
+	return items
+
+
+def _many_values(cls, n):
+	d = cls()
+	for i in range(n):
+		d.append('tag', ['tag%i' % i])
+	return d
+
+
+@benchmark
+def bench_multidict(n=10 ** 6):
+	measure('legacy: %i dicts' % n, _many_dicts, LegacyMultiDict, n)
+	measure('current: %i dicts' % n, _many_dicts, cctool.MultiDict, n)
+
+	k = n // 10
+	measure('legacy: %i appended' % k, _many_appended, LegacyMultiDict, k)
+	measure('current: %i appended' % k, _many_appended, cctool.MultiDict, k)
+
+	# the legacy append is quadratic, so keep this one small
+	k = 5000
+	measure('legacy: %i values, one key' % k, _many_values, LegacyMultiDict, k)
+	measure('current: %i values, one key' % k, _many_values, cctool.MultiDict, k)
+	measure('current: %i values, one key' % n, _many_values, cctool.MultiDict, n)
+
+
+def legacy_bsdcal_load(fh):
+	"""BSDCal.load as of cctool 0.1.1, including the old MultiDict."""
+	year = datetime.today().year
+	for line in fh:
+		m = re.match(b'(\\d\\d)\\/(\\d\\d)(\\*?)\t(.*)', line.rstrip())
+		if m:
+			month, day, yearly, summary = m.groups()
+
+			mdict = LegacyMultiDict()
+			mdict['dtstart'] = [datetime(year, int(month), int(day))]
+			mdict['summary'] = [summary.decode('utf8')]
+			if yearly == b'*':
+				mdict['freq'] = ['yearly']
+
+			yield mdict
+
+
+def _consume(items):
+	n = 0
+	for item in items:
+		n += 1
+	return n
+
+
+@benchmark
+def bench_bsdcal(n=10 ** 6):
+	lines = [b'%02i/%02i%s\tsummary %i\n' % (
+		i % 12 + 1, i % 28 + 1, b'*' if i % 3 else b'', i) for i in range(n)]
+	text = b''.join(lines)
+
+	for label, load in [
+		('legacy', legacy_bsdcal_load),
+		('current', cctool.BSDCal.load),
+	]:
+		start = default_timer()
+		count = _consume(load(BytesIO(text)))
+		duration = default_timer() - start
+		print('%-30s %8.3fs %10.0f lines/s' % (
+			'%s: %i lines' % (label, count), duration, n / duration))
+
+
+def legacy_bsdcal_dump(data, fh):
+	"""BSDCal.dump as of cctool 0.1.1."""
+	_fh = codecs.getwriter('utf8')(fh)
+	for item in data:
+		if 'dtstart' in item and 'summary' in item:
+			dt = item.first('dtstart')
+			if 'yearly' in item['freq']:
+				_fh.write('%s\t%s\n' % (dt.strftime('%m/%d*'), item.join('summary')))
+			elif dt.year == datetime.today().year:
+				_fh.write('%s\t%s\n' % (dt.strftime('%m/%d'), item.join('summary')))
+
+
+def legacy_abook_dump(data, fh):
+	"""ABook.dump as of cctool 0.1.1 (python 3 only)."""
+	cp = ConfigParser()
+	_fh = codecs.getwriter('utf8')(fh)
+	for i, _item in enumerate(data):
+		item = cctool.map_keys(_item, cctool.ABook.fields, reverse=True)
+		section = str(i)
+		cp.add_section(section)
+		for key in item:
+			if key == 'bday':
+				dt = item.first(key)
+				if dt.year == 1900:
+					value = dt.strftime('--%m-%d')
+				else:
+					value = dt.strftime('%Y-%m-%d')
+				cp.set(section, key, value)
+			elif key in cctool.ABook.fields:
+				cp.set(section, key, item.join(key))
+	cp.write(_fh)
+
+
+def _compare_dumps(label, data, legacy, current):
+	for name, dump in [('legacy', legacy), ('current', current)]:
+		fh = BytesIO()
+		start = default_timer()
+		dump(data, fh)
+		duration = default_timer() - start
+		speed = len(fh.getvalue()) / duration / 2.0 ** 20
+		print('%-30s %8.3fs %10.1f MiB/s' % (
+			'%s: %i %s' % (name, len(data), label), duration, speed))
+
+
+@benchmark
+def bench_writers(n=2 * 10 ** 5):
+	year = datetime.today().year
+	events = [cctool.MultiDict([
+		('dtstart', [datetime(year, i % 12 + 1, i % 28 + 1)]),
+		('summary', ['summary %i' % i]),
+		('freq', ['yearly'] if i % 2 else []),
+	]) for i in range(n)]
+	_compare_dumps('events', events, legacy_bsdcal_dump, cctool.BSDCal.dump)
+
+	persons = [cctool.MultiDict([
+		('name', ['name %i' % i]),
+		('email', ['%i@example.com' % i, 'other%i@example.com' % i]),
+		('bday', [datetime(1900 + i % 100, i % 12 + 1, i % 28 + 1)]),
+	]) for i in range(n)]
+	_compare_dumps('persons', persons, legacy_abook_dump, cctool.ABook.dump)
+
+
+def legacy_abook_load(fh):
+	"""ABook.load as of cctool 0.1.1."""
+	_fh = codecs.getreader('utf8')(fh)
+	config_parser = ConfigParser()
+	config_parser.read_file(_fh)
+	for section in config_parser.sections():
+		if section != 'format':
+			d = LegacyMultiDict()
+			for key, value in config_parser.items(section):
+				if key == 'bday':
+					if value[0] == '-':
+						value = '1900' + value[1:]
+					d[key] = [datetime.strptime(value, '%Y-%m-%d')]
+				else:
+					d[key] = value.split(',')
+			yield cctool.map_keys(d, cctool.ABook.fields)
+
+
+def _compare_loads(label, n, text, legacy, current):
+	for name, load in [('legacy', legacy), ('current', current)]:
+		_label = '%s: %i %s' % (name, n, label)
+		measure(_label, lambda: _consume(load(BytesIO(text))))
+
+
+@benchmark
+def bench_abook(n=10 ** 5):
+	text = b'[format]\nprogram=abook\nversion=0.6.1\n\n' + b''.join(
+		b'[%i]\nname=name %i\nemail=%i@example.com,other@example.com\n'
+		b'bday=--%02i-%02i\nnick=n%i\n\n' % (
+			i, i, i, i % 12 + 1, i % 28 + 1, i) for i in range(n))
+	_compare_loads('contacts', n, text, legacy_abook_load, cctool.ABook.load)
+
+
+def legacy_ldif_load(fh):
+	"""LDIF.load as of cctool 0.1.1."""
+	import ldif3
+	# ldif3 still uses a function that was removed in python 3.9
+	if not hasattr(base64, 'decodestring'):
+		base64.decodestring = base64.decodebytes
+	parser = ldif3.LDIFParser(fh, strict=False)
+	for dn, entry in parser.parse():
+		yield cctool.map_keys(
+			LegacyMultiDict(entry), {'cn': 'name', 'mail': 'email'})
+
+
+@benchmark
+def bench_ldif(n=2 * 10 ** 4):
+	photo = base64.b64encode(os.urandom(3000))
+	photo = b'\n '.join(photo[i:i + 76] for i in range(0, len(photo), 76))
+	text = b''.join(
+		b'dn: cn=name %i,dc=example,dc=com\n'
+		b'objectClass: inetOrgPerson\n'
+		b'cn: name %i\nsn: %i\nmail: %i@example.com\n'
+		b'telephoneNumber: +1 555 %i\ndescription: some text\n'
+		b'jpegPhoto:: %s\n\n' % (i, i, i, i, i, photo) for i in range(n))
+
+	for label, load in [
+		('legacy', legacy_ldif_load),
+		('current', cctool.LDIF.load),
+	]:
+		try:
+			start = default_timer()
+			count = _consume(load(BytesIO(text)))
+		except ImportError as err:
+			print('%-30s %s' % (label + ':', err))
+			continue
+		duration = default_timer() - start
+		print('%-30s %8.3fs %10.1f MiB/s' % ('%s: %i entries' % (
+			label, count), duration, len(text) / duration / 2.0 ** 20))
+
+
+@benchmark
+def bench_vcf(n=2 * 10 ** 4):
+	photo = base64.b64encode(os.urandom(3000))
+	photo = b'\r\n '.join(photo[i:i + 74] for i in range(0, len(photo), 74))
+	text = b''.join(
+		b'BEGIN:VCARD\r\nVERSION:3.0\r\nFN:name %i\r\nN:%i;name;;;\r\n'
+		b'EMAIL;TYPE=INTERNET:%i@example.com\r\nTEL;TYPE=CELL:+1 555 %i\r\n'
+		b'BDAY:1980-%02i-%02i\r\nADR;TYPE=HOME:;;street %i;city;;%05i;\r\n'
+		b'PHOTO;ENCODING=b;TYPE=JPEG:%s\r\nEND:VCARD\r\n' % (
+			i, i, i, i, i % 12 + 1, i % 28 + 1, i, i, photo) for i in range(n))
+
+	start = default_timer()
+	data = list(cctool.VCard.load(BytesIO(text)))
+	duration = default_timer() - start
+	print('%-30s %8.3fs %10.1f MiB/s' % ('load: %i entries' % len(data),
+		duration, len(text) / duration / 2.0 ** 20))
+	measure('dump: %i entries' % n, cctool.VCard.dumps, data)
+
+
+@benchmark
+def bench_csv(n=5 * 10 ** 5):
+	persons = [cctool.MultiDict([
+		('name', ['name %i' % i]),
+		('email', ['%i@example.com' % i]),
+		('phone', ['+1 555 %i' % i]),
+		('bday', [datetime(1980, i % 12 + 1, i % 28 + 1)]),
+		('tag', ['a', 'b']),
+	]) for i in range(n)]
+
+	for label, cls in [('jsonl', cctool.JSONLines), ('csv', cctool.CSV)]:
+		measure('%s dump: %i entries' % (label, n), cls.dumps, persons)
+		text = cls.dumps(persons)
+		measure('%s load: %i entries' % (label, n),
+			lambda: _consume(cls.load(BytesIO(text))))
+
+
+def _open_plain(filename):
+	return open(filename, 'rb')
+
+
+@benchmark
+def bench_mmap(n=16):
+	"""Read a file of `n` MiB with open() and with a memory map."""
+	tmpdir = tempfile.mkdtemp()
+	try:
+		filename = os.path.join(tmpdir, 'bench.jsonl')
+		persons = [cctool.MultiDict([
+			('name', ['name %i' % i]),
+			('email', ['%i@example.com' % i]),
+		]) for i in range(1000)]
+		block = cctool.JSONLines.dumps(persons)
+		with open(filename, 'wb') as fh:
+			for i in range(n * 2 ** 20 // len(block)):
+				fh.write(block)
+
+		for label, _open in [
+			('open', _open_plain),
+			('mmap', cctool.MappedFile.open),
+		]:
+			def lines():
+				fh = _open(filename)
+				try:
+					return _consume(fh)
+				finally:
+					fh.close()
+
+			def load():
+				fh = _open(filename)
+				try:
+					return _consume(cctool.JSONLines.load(fh))
+				finally:
+					fh.close()
+
+			measure('%s: lines' % label, lines)
+			measure('%s: jsonl entries' % label, load)
+	finally:
+		shutil.rmtree(tmpdir)
+
+
+@benchmark
+def bench_parallel(n=256):
+	"""Parse a bsdcal file of `n` MiB with and without --jobs.
+
+	Use e.g. ``-n 4096`` for a multi-GB file.
+	"""
+	tmpdir = tempfile.mkdtemp()
+	try:
+		filename = os.path.join(tmpdir, 'bench.bsdcal')
+		line = b'01/01*\tsome summary that is not too short\n'
+		block = line * (2 ** 20 // len(line))
+		with open(filename, 'wb') as fh:
+			for i in range(n):
+				fh.write(block)
+
+		jobs = max(multiprocessing.cpu_count(), 2)
+		for argv in [[filename], ['-j', str(jobs), filename]]:
+			args = cctool.parse_args(argv)
+			start = default_timer()
+			count = _consume(cctool.iter_input(args))
+			duration = default_timer() - start
+			print('%-30s %8.3fs %10.1f MiB/s' % ('%i jobs: %i entries' % (
+				args.jobs, count), duration, n / duration))
+	finally:
+		shutil.rmtree(tmpdir)
+
+
+@benchmark
+def bench_index(n=10 ** 5):
+	text = b''.join(b'[%i]\nname=name %i\nemail=%i@example.com\n\n' % (
+		i, i, i) for i in range(n))
+	email = '%i@example.com' % (n // 2)
+
+	def scan():
+		return [item for item in cctool.ABook.loads(text)
+			if email in item['email']]
+
+	index = measure('build index: %i contacts' % n,
+		cctool.build_index, cctool.ABook, text, ['email'])
+	measure('full scan: 1 contact', scan)
+	measure('query: 1 contact', lambda: list(cctool.query_index(
+		cctool.ABook, text, index, [('email', email)])))
+
+
+@benchmark
+def bench_records(n=2 * 10 ** 5):
+	persons = [cctool.MultiDict([
+		('name', ['name %i' % i]),
+		('email', ['%i@example.com' % i, 'other%i@example.com' % i]),
+		('bday', [datetime(1900 + i % 100, i % 12 + 1, i % 28 + 1)]),
+		('tag', ['friends']),
+	]) for i in range(n)]
+
+	for label, cls in [('pickle', cctool.Pickle), ('rec', cctool.Records)]:
+		start = default_timer()
+		text = cls.dumps(persons)
+		duration = default_timer() - start
+		print('%-30s %8.3fs %10.1f MiB' % ('%s: dump %i' % (label, n),
+			duration, len(text) / 2.0 ** 20))
+		measure('%s: load %i' % (label, n),
+			lambda: _consume(cls.loads(text)))
+
+	reader = cctool.RecordReader(text)
+	k = 10 ** 4
+	measure('rec: %i random records' % k,
+		lambda: [reader[i * 7919 % n] for i in range(k)])
+
+
+def _import_time(names):
+	"""Cumulative ``-X importtime`` of importing `names`, in seconds."""
+	output = subprocess.check_output([sys.executable, '-X', 'importtime',
+		'-c', 'import %s' % ', '.join(names)], stderr=subprocess.STDOUT,
+		cwd=os.path.dirname(os.path.abspath(cctool.__file__)))
+	total = 0
+	for line in output.decode('utf8').splitlines():
+		parts = line.split('|')
+		if len(parts) == 3 and parts[2].strip() in names:
+			total += int(parts[1])
+	return total / 1e6
+
+
+@benchmark
+def bench_startup(n=20):
+	"""Compare ``python -X importtime`` with and without eager backends.
+
+	cctool 0.1.1 imported all optional backends at import time.
+	"""
+	for label, names in [
+		('legacy', ['icalendar', 'ldif3', 'yaml', 'cctool']),
+		('current', ['cctool']),
+	]:
+		times = sorted(_import_time(names) for i in range(n))
+		print('%-30s %8.3fs' % ('%s: import' % label, times[n // 2]))
+
+	with open(os.devnull, 'rb') as devnull:
+		start = default_timer()
+		for i in range(n):
+			subprocess.check_output([sys.executable, cctool.__file__,
+				'-f', 'bsdcal', '-t', 'json'], stdin=devnull)
+		duration = default_timer() - start
+	print('%-30s %8.3fs' % ('current: bsdcal to json', duration / n))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('names', nargs='*', metavar='NAME',
+		help='one of: %s' % ', '.join(BENCHMARKS.keys()))
+	parser.add_argument('-n', type=int,
+		help='override the size of the workload')
+	args = parser.parse_args()
+
+	for name in args.names:
+		if name not in BENCHMARKS:
+			parser.error('unknown benchmark: %s' % name)
+
+	for name in args.names or BENCHMARKS.keys():
+		print('# %s' % name)
+		if args.n is None:
+			BENCHMARKS[name]()
+		else:
+			BENCHMARKS[name](args.n)
+
+
+if __name__ == '__main__':
+	main()
@@ -25,7 +25,7 @@ While each item is a generic MultiDict, there are typically two usecases:
 
 - A *person* with the possible fields 'name', 'nick', 'bday', 'email',
   'address_lines', 'city', 'state', 'zip', 'country', 'phone', 'workphone',
-  'mobile', 'xmpp', 'icq', 'msn', 'twitter', and 'pgp'.
+  'mobile', 'org', 'xmpp', 'icq', 'msn', 'twitter', and 'pgp'.
 
 - An *event* with the possible fields 'description', 'location', 'summary',
   'dtend', 'dtstart', and 'freq'.
@@ -37,43 +37,81 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from collections import OrderedDict
+from collections import deque
+from contextlib import contextmanager
 from datetime import date
 from datetime import datetime
+from datetime import timedelta
+from datetime import tzinfo
 from io import BytesIO
 import argparse
+import base64
 import codecs
+import csv
+import functools
+import hashlib
+import heapq
+import importlib
+import io
+import itertools
 import json
+import mmap
 import os
 import pickle
+import quopri
 import re
+import struct
 import sys
+import tempfile
 
 try:  # pragma: nocover
-	from ConfigParser import RawConfigParser as ConfigParser
+	from datetime import timezone
 except ImportError:  # pragma: nocover
-	from configparser import RawConfigParser as ConfigParser
+	class timezone(tzinfo):
+		"""Fixed offset timezone for python 2."""
 
-try:  # pragma: nocover
-	import ldif3
-except ImportError as err:  # pragma: nocover
-	ldif3 = err
+		def __init__(self, offset):
+			self._offset = offset
 
-try:  # pragma: nocover
-	import icalendar
-except ImportError as err:  # pragma: nocover
-	icalendar = err
+		def utcoffset(self, dt):
+			return self._offset
+
+		def dst(self, dt):
+			return timedelta(0)
+
+		def tzname(self, dt):
+			return None
+
+if bytes is str:  # pragma: nocover
+	# python 2 indexes str by character, but bytearray by byte value
+	_indexable = bytearray
+else:  # pragma: nocover
+	_indexable = lambda buf: buf
 
 try:  # pragma: nocover
-	import yaml
-except ImportError as err:  # pragma: nocover
-	yaml = err
+	from importlib.util import find_spec as _find_spec
+except ImportError:  # pragma: nocover
+	from pkgutil import find_loader as _find_spec
 
 NOTSET = object()
-PERSON = ['abook', 'ldif']
-EVENT = ['bsdcal', 'ics']
+_SEEN_THRESHOLD = 8
+_NONDIGIT = re.compile(r'\D', re.UNICODE)
+DATE_FIELDS = ['bday', 'dtstart', 'dtend']
+# see the module docstring
+PERSON_FIELDS = [
+	'name', 'nick', 'bday', 'email', 'address_lines', 'city', 'state', 'zip',
+	'country', 'phone', 'workphone', 'mobile', 'org', 'xmpp', 'icq', 'msn',
+	'twitter', 'pgp']
+EVENT_FIELDS = [
+	'description', 'location', 'summary', 'dtend', 'dtstart', 'freq']
+GENERIC_FIELDS = ['tag', 'comment', 'url']
+SPLIT_SIZE = 2 ** 22
 
 __version__ = '0.1.1'
 
+# dicts keep insertion order since python 3.7
+_dict = dict if sys.version_info >= (3, 7) else OrderedDict
+
 
 def _str(x):  # pragma: nocover
 	try:
@@ -82,42 +120,177 @@ def _str(x):  # pragma: nocover
 		return str(x)
 
 
-def formats():  # pragma: nocover
-	informats = {
-		'bsdcal': BSDCal,
-		'abook': ABook,
-		'json': JSON,
-		'pickle': Pickle,
-	}
-	outformats = {
-		'bsdcal': BSDCal,
-		'abook': ABook,
-		'json': JSON,
-		'pickle': Pickle,
-	}
-	if not isinstance(icalendar, Exception):  # pragma: nocover
-		informats['ics'] = ICal
-		outformats['ics'] = ICal
-	if not isinstance(ldif3, Exception):  # pragma: nocover
-		informats['ldif'] = LDIF
-	if not isinstance(yaml, Exception):  # pragma: nocover
-		informats['yml'] = YAML
-		outformats['yml'] = YAML
+_text = type('')
+# includes long in python 2
+_integer = (int, type(2 ** 64))
+_TWO_DIGITS = ['%02i' % i for i in range(100)]
+
+
+def _format_date(dt, year=True):
+	"""Locale independent ``strftime('%Y-%m-%d')`` or ``('--%m-%d')``."""
+	if year:
+		return '%04i-%s-%s' % (
+			dt.year, _TWO_DIGITS[dt.month], _TWO_DIGITS[dt.day])
+	else:
+		return '--%s-%s' % (_TWO_DIGITS[dt.month], _TWO_DIGITS[dt.day])
+
+
+@contextmanager
+def _text_writer(fh):
+	"""Wrap a bytes stream in a single buffered UTF-8 text stream.
+
+	The bytes stream is flushed but not closed on exit.
+	"""
+	try:
+		_fh = io.TextIOWrapper(fh, encoding='utf8', newline='')
+	except AttributeError:  # pragma: nocover
+		# python 2 file objects do not implement the io interfaces
+		_fh = codecs.getwriter('utf8')(fh)
+		try:
+			yield _fh
+		finally:
+			_fh.flush()
+		return
+	try:
+		yield _fh
+	finally:
+		_fh.flush()
+		_fh.detach()
+
+
+_backends = {}
+_formats = None
+_plugins = None
+
+
+def has_backend(name):
+	"""Check whether an optional dependency is installed without importing it."""
+	if name in _backends:
+		return not isinstance(_backends[name], Exception)
+	return _find_spec(name) is not None
+
+
+def import_backend(name):
+	"""Import an optional dependency on first use.
+
+	Some of them (e.g. icalendar) take longer to import than everything else
+	cctool needs, so they are only imported once a format actually uses them.
+	Raises :py:exc:`ImportError` if the dependency is missing.
+	"""
+	if name not in _backends:
+		try:
+			_backends[name] = importlib.import_module(name)
+		except ImportError as err:
+			_backends[name] = err
+	if isinstance(_backends[name], Exception):
+		raise _backends[name]
+	return _backends[name]
+
+
+def _entry_points(group):
+	try:
+		from importlib.metadata import entry_points
+	except ImportError:  # pragma: nocover
+		try:
+			from pkg_resources import iter_entry_points
+		except ImportError:
+			return []
+		return list(iter_entry_points(group))
+	eps = entry_points()
+	if hasattr(eps, 'select'):
+		return list(eps.select(group=group))
+	return list(eps.get(group, []))  # pragma: nocover
+
+
+def _builtin_formats():
+	global _formats
+	if _formats is None:
+		_formats = {}
+		for name, cls in [
+			('bsdcal', BSDCal),
+			('abook', ABook),
+			('json', JSON),
+			('jsonl', JSONLines),
+			('pickle', Pickle),
+			('rec', Records),
+			('ics', ICal),
+			('ldif', LDIF),
+			('vcf', VCard),
+			('csv', CSV),
+			('tsv', TSV),
+			('yml', YAML),
+		]:
+			if cls.backend is None or has_backend(cls.backend):
+				_formats[name] = cls
+	return _formats
+
+
+def _plugin_formats():
+	global _plugins
+	if _plugins is None:
+		_plugins = {}
+		for ep in _entry_points('cctool.formats'):
+			try:
+				_plugins[ep.name] = ep.load()
+			except ImportError:
+				pass
+	return _plugins
+
+
+def get_format(name, method=None):
+	"""Return the format class registered as `name` or None.
+
+	Built-in formats take precedence.  Plugins from the ``cctool.formats``
+	entry point group are only discovered if `name` is not a built-in
+	format, because scanning installed packages is slow.  If `method` is
+	``'load'`` or ``'dump'``, only formats that implement it are considered.
+	"""
+	for registry in [_builtin_formats, _plugin_formats]:
+		cls = registry().get(name)
+		if cls is not None and (method is None or cls.implements(method)):
+			return cls
+
+
+def formats():
+	"""Return dicts of all available input and output formats."""
+	registry = dict(_plugin_formats())
+	registry.update(_builtin_formats())
+	informats = {}
+	outformats = {}
+	for name, cls in registry.items():
+		if cls.implements('load'):
+			informats[name] = cls
+		if cls.implements('dump'):
+			outformats[name] = cls
 	return informats, outformats
 
 
-class MultiDict(OrderedDict):
-	"""Dict subclass with multiple values for each key."""
+class MultiDict(_dict):
+	"""Dict subclass with multiple values for each key.
+
+	Values are deduplicated on :py:meth:`append`.  Short lists are
+	replaced by a new list on every append, so lists that are passed in
+	from outside are never changed.  Once a list grows beyond a few values,
+	it is copied one last time and then extended in place, with a side set
+	of its hashable values so that deduplication does not need a linear
+	scan.
+
+	Like ``dict(d)``, ``MultiDict(d)`` shares the lists of `d`, so later
+	appends to `d` may show up in it.  :py:meth:`copy` and
+	:py:func:`copy.copy` return independent copies.
+	"""
+
+	__slots__ = ('_owned',)
+
+	def __repr__(self):
+		return '%s(%r)' % (self.__class__.__name__, list(self.items()))
 
 	def __contains__(self, key):
-		return (super(MultiDict, self).__contains__(key) and
-			super(MultiDict, self).__getitem__(key) != [])
+		return bool(_dict.get(self, key))
 
 	def __getitem__(self, key):
-		if key in self:
-			return super(MultiDict, self).__getitem__(key)
-		else:
-			return []
+		value = _dict.get(self, key)
+		return [] if value is None else value
 
 	def first(self, key, default=NOTSET):
 		if key in self:
@@ -138,11 +311,67 @@ class MultiDict(OrderedDict):
 		else:
 			raise KeyError(key)
 
+	def _items(self):
+		# lists that are extended in place must not be shared with copies
+		owned = getattr(self, '_owned', None)
+		for key, values in self.items():
+			if owned and key in owned and owned[key][0] is values:
+				values = list(values)
+			yield key, values
+
+	def copy(self):
+		"""Return a shallow copy that is not affected by later appends."""
+		return self.__class__(self._items())
+
+	__copy__ = copy
+
+	def __reduce__(self):
+		# the side sets can be rebuilt, so they are not pickled
+		return (self.__class__, (), None, None, self._items())
+
+	def _state(self, key, current):
+		# _owned is only created for long lists to keep small entries lean
+		try:
+			owned = self._owned
+		except AttributeError:
+			owned = self._owned = {}
+		state = owned.get(key)
+		if state is None or state[0] is not current:
+			current = list(current)
+			seen = set()
+			for value in current:
+				try:
+					seen.add(value)
+				except TypeError:
+					pass
+			state = owned[key] = [current, seen]
+		return state
+
 	def append(self, key, values):
-		"""Add a list of values."""
+		"""Add an iterable of values."""
+		values = list(values)
+		stored = _dict.get(self, key) or []
+		if len(stored) + len(values) <= _SEEN_THRESHOLD:
+			current = list(stored)
+			for value in values:
+				if value not in current:
+					current.append(value)
+			if current:
+				_dict.__setitem__(self, key, current)
+			return
+
+		current, seen = self._state(key, stored)
 		for value in values:
-			if value not in self[key]:
-				self[key] = self[key] + [value]
+			try:
+				if value in seen:
+					continue
+				seen.add(value)
+			except TypeError:
+				if value in current:
+					continue
+			current.append(value)
+		if current is not stored:
+			_dict.__setitem__(self, key, current)
 
 	def update(self, other):
 		"""Update this MultiDict with the contentes of another one."""
@@ -150,17 +379,302 @@ class MultiDict(OrderedDict):
 			self.append(key, other[key])
 
 
+NORMALIZERS = {
+	'casefold': lambda s: getattr(s, 'casefold', s.lower)(),
+	'digits': lambda s: _NONDIGIT.sub('', s),
+	'space': lambda s: ' '.join(s.split()),
+}
+
+
+def parse_merge_key(spec):
+	"""Split a merge key like ``'email:casefold'`` into field and normalizer."""
+	field, _, name = spec.partition(':')
+	if not field:
+		raise ValueError('Missing merge field: %s' % spec)
+	if name and name not in NORMALIZERS:
+		raise ValueError('Unknown normalizer: %s' % name)
+	return field, NORMALIZERS.get(name)
+
+
+def _merge_values(entry, keys, cache):
+	for i, (field, normalize) in enumerate(keys):
+		for value in entry[field]:
+			if normalize is not None and hasattr(value, 'split'):
+				try:
+					value = cache[i, value]
+				except KeyError:
+					value = cache[i, value] = normalize(value)
+				if not value:
+					continue
+			yield i, value
+
+
+def _merge_groups(entries, keys, cache):
+	"""Group the indices of `entries` that share a value of `keys`.
+
+	Groups are ordered by their smallest index.
+	"""
+	parents = list(range(len(entries)))
+
+	def find(i):
+		while parents[i] != i:
+			parents[i] = parents[parents[i]]
+			i = parents[i]
+		return i
+
+	index = dict()
+	for i, entry in enumerate(entries):
+		for value in _merge_values(entry, keys, cache):
+			j = index.setdefault(value, i)
+			if j != i:
+				a, b = find(i), find(j)
+				if a != b:
+					parents[max(a, b)] = min(a, b)
+
+	groups = OrderedDict()
+	for i in range(len(entries)):
+		groups.setdefault(find(i), []).append(i)
+	return list(groups.values())
+
+
 def merged(data, key):
-	"""Outer join `data` on `key`."""
-	tmp = list()
-	for entry in data:
-		for other in tmp:
-			if not set(entry[key]).isdisjoint(other[key]):
-				other.update(entry)
+	"""Outer join `data` on `key`.
+
+	`key` is a field name or a list of field names, each optionally followed
+	by the name of a normalizer from :py:data:`NORMALIZERS`, e.g.
+	``['email:casefold', 'phone:digits']``.
+
+	Entries that share at least one (normalized) value of any key end up in
+	the same group, also transitively.  The values are indexed in a dict and
+	groups are tracked in a union-find structure, so this runs in
+	near-linear time and the grouping does not depend on the order of
+	`data`.  Normalized values are computed once per entry and memoized.
+
+	Each group is returned as its first entry, updated with the others in
+	input order.
+	"""
+	if hasattr(key, 'split'):
+		key = [key]
+	keys = [parse_merge_key(k) for k in key]
+
+	entries = list(data)
+	result = []
+	for group in _merge_groups(entries, keys, dict()):
+		entry = entries[group[0]]
+		for i in group[1:]:
+			entry.update(entries[i])
+		result.append(entry)
+	return result
+
+
+def _sort_value(value):
+	if isinstance(value, datetime):
+		offset = value.utcoffset()
+		if offset is not None:
+			value = (value - offset).replace(tzinfo=None)
+		return (1, value)
+	elif isinstance(value, date):
+		return (1, datetime(value.year, value.month, value.day))
+	elif isinstance(value, (int, float)) and not isinstance(value, bool):
+		return (0, value)
+	else:
+		return (2, _str(value))
+
+
+def sort_key(field, missing='first'):
+	"""Return a function that computes a sort key for entries by `field`.
+
+	The key is a plain tuple, so it can be precomputed and compared cheaply.
+	Numbers sort before dates and dates before strings; dates without time
+	are treated as midnight and aware datetimes are converted to UTC.
+	Entries without `field` sort first or last depending on `missing`.
+	"""
+	if missing not in ['first', 'last']:
+		raise ValueError(missing)
+	rank = (0,) if missing == 'first' else (2,)
+
+	def key(entry):
+		values = entry[field]
+		if values:
+			return (1, tuple(_sort_value(v) for v in values))
+		else:
+			return rank
+
+	return key
+
+
+def _write_pickles(fh, objs):
+	for obj in objs:
+		pickle.dump(obj, fh, pickle.HIGHEST_PROTOCOL)
+
+
+def _read_pickles(fh):
+	while True:
+		try:
+			yield pickle.load(fh)
+		except EOFError:
+			break
+
+
+def _spill(run, tmpdir=None):
+	fh = tempfile.TemporaryFile(dir=tmpdir)
+	_write_pickles(fh, ((k, i, list(entry.items())) for k, i, entry in run))
+	fh.seek(0)
+	return fh
+
+
+def _unspill(fh):
+	for k, i, items in _read_pickles(fh):
+		yield k, i, MultiDict(items)
+
+
+def external_sorted(data, key, buffer_size=100000, tmpdir=None):
+	"""Stable sort of `data` that keeps at most `buffer_size` entries in memory.
+
+	Once the buffer is full, it is sorted and spilled to a temporary file.
+	The sorted runs are then merged lazily.  Keys are computed only once per
+	entry and stored alongside it.
+	"""
+	runs = []
+	buf = []
+	try:
+		for i, entry in enumerate(data):
+			buf.append((key(entry), i, entry))
+			if len(buf) >= buffer_size:
+				buf.sort(key=lambda x: x[:2])
+				runs.append(_spill(buf, tmpdir))
+				buf = []
+		buf.sort(key=lambda x: x[:2])
+
+		streams = [_unspill(fh) for fh in runs] + [iter(buf)]
+		for k, i, entry in heapq.merge(*streams):
+			yield entry
+	finally:
+		for fh in runs:
+			fh.close()
+
+
+def fingerprint(entry):
+	"""Stable hash of the content of `entry`, independent of key order."""
+	s = json.dumps(entry, sort_keys=True, cls=DateTimeJSONEncoder,
+		ensure_ascii=False, separators=(',', ':'))
+	return hashlib.sha1(s.encode('utf8')).hexdigest()
+
+
+def sync(data, groups=None, key=None, sortkey=None, identity=None):
+	"""Incremental version of :py:func:`merged` and :py:func:`sort_key`.
+
+	`groups` is the result of a previous call.  Each group is a dict with
+	the ``members`` it was merged from (identified by their fingerprint and
+	occurrence), the resulting ``entry``, its ``fp`` and its sort ``key``.
+
+	Only groups that lost a member or share a merge value with a new entry
+	are merged again, all other groups and their sort keys are reused.  The
+	result is the same as ``merged()`` followed by a stable sort.
+
+	An output entry whose members all changed is matched to a previous one
+	that shares a value of `identity` (by default the merge `key`), so that
+	it is counted as changed instead of added and removed.
+
+	Returns the new groups in output order and the number of added, changed
+	and removed output entries.
+	"""
+	def parse(key):
+		if key is None:
+			return []
+		if hasattr(key, 'split'):
+			key = [key]
+		return [parse_merge_key(k) for k in key]
+
+	keys = parse(key)
+	identity = keys if identity is None else parse(identity)
+	cache = dict()
+
+	entries = list(data)
+	ids = []
+	seen = dict()
+	for entry in entries:
+		fp = fingerprint(entry)
+		n = seen.get(fp, 0)
+		seen[fp] = n + 1
+		ids.append((fp, n))
+	position = dict((_id, i) for i, _id in enumerate(ids))
+
+	old = dict()
+	for j, group in enumerate(groups or []):
+		for _id in group['members']:
+			old[_id] = j
+
+	pool = [i for i, _id in enumerate(ids) if _id not in old]
+	values = set()
+	for i in pool:
+		values.update(_merge_values(entries[i], keys, cache))
+
+	result = []
+	kept = set()
+	for j, group in enumerate(groups or []):
+		try:
+			pos = [position[_id] for _id in group['members']]
+		except KeyError:
+			pos = None
+		if pos is not None and pos == sorted(pos) and values.isdisjoint(
+				_merge_values(group['entry'], keys, cache)):
+			result.append((pos[0], group))
+			kept.add(j)
+		else:
+			pool.extend(position[_id] for _id in group['members']
+				if _id in position)
+	pool.sort()
+
+	claimed = set()
+	fresh = []
+	changed = 0
+	for members in _merge_groups([entries[i] for i in pool], keys, cache):
+		members = [pool[j] for j in members]
+		entry = entries[members[0]]
+		for i in members[1:]:
+			entry.update(entries[i])
+		group = {
+			'members': [ids[i] for i in members],
+			'entry': entry,
+			'fp': fingerprint(entry) if len(members) > 1 else ids[members[0]][0],
+			'key': sortkey(entry) if sortkey is not None else None,
+		}
+		result.append((members[0], group))
+
+		previous = set(old[_id] for _id in group['members'] if _id in old)
+		previous -= claimed
+		if not previous:
+			fresh.append(group)
+		elif group['fp'] not in set(groups[j]['fp'] for j in previous):
+			changed += 1
+		claimed.update(previous)
+
+	added = 0
+	cache = dict()
+	lookup = dict()
+	for j, group in enumerate(groups or []):
+		if j not in kept and j not in claimed:
+			for value in _merge_values(group['entry'], identity, cache):
+				lookup.setdefault(value, j)
+	for group in fresh:
+		for value in _merge_values(group['entry'], identity, cache):
+			j = lookup.get(value)
+			if j is not None and j not in claimed:
+				claimed.add(j)
+				if group['fp'] != groups[j]['fp']:
+					changed += 1
 				break
 		else:
-			tmp.append(entry)
-	return tmp
+			added += 1
+
+	removed = len(groups or []) - len(kept) - len(claimed)
+
+	if sortkey is not None:
+		result.sort(key=lambda x: (x[1]['key'], x[0]))
+	else:
+		result.sort(key=lambda x: x[0])
+	return [group for pos, group in result], (added, changed, removed)
 
 
 def map_keys(mdict, _map, reverse=False, exclusive=True):
@@ -192,13 +706,100 @@ def event2person(data, reverse=False):
 			yield target
 
 
+class MappedFile(object):
+	"""Read-only bytes stream on top of a memory map.
+
+	Loaders can use it like any other file object, but only the parts that
+	are actually read are copied.  The underlying map is available as
+	:py:attr:`buffer` so that it can be searched directly, e.g. with a
+	compiled regular expression.
+	"""
+
+	def __init__(self, buf, start=0, end=None, name=None):
+		self.buffer = buf
+		self.end = len(buf) if end is None else end
+		self.name = name
+		buf.seek(start)
+
+	@classmethod
+	def open(cls, filename, start=0, end=None):
+		with open(filename, 'rb') as fh:
+			buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+		return cls(buf, start, end, name=filename)
+
+	# the position of the map itself is used so that reading lines can be
+	# left to its readline() method, which is implemented in C
+	@property
+	def pos(self):
+		return self.buffer.tell()
+
+	@pos.setter
+	def pos(self, value):
+		self.buffer.seek(value)
+
+	def read(self, size=-1):
+		n = self.end - self.pos
+		if size is not None and 0 <= size < n:
+			n = size
+		return self.buffer.read(max(n, 0))
+
+	def readline(self):
+		pos = self.pos
+		line = self.buffer.readline()
+		if pos + len(line) > self.end:
+			line = line[:max(self.end - pos, 0)]
+			self.pos = max(self.end, pos)
+		return line
+
+	def __iter__(self):
+		if self.end == len(self.buffer):
+			return iter(self.buffer.readline, b'')
+		return self._iter_range()
+
+	def _iter_range(self):
+		remaining = self.end - self.pos
+		for line in iter(self.buffer.readline, b''):
+			remaining -= len(line)
+			if remaining <= 0:
+				if remaining < 0:
+					line = line[:remaining]
+					self.pos = self.end
+				if line:
+					yield line
+				break
+			yield line
+
+	def close(self):
+		self.buffer.close()
+
+
 class Format(object):
 	"""Baseclass with an API similar to the marshal, pickle and json modules.
 
 	:py:meth:`load` takes a bytes stream and returns a :py:class:`MultiDict`.
 	:py:meth:`dump` does the reverse.
+
+	Other packages can add formats by registering a subclass in the
+	``cctool.formats`` entry point group, e.g.
+	``entry_points={'cctool.formats': ['csv = mypackage:CSV']}``.  The
+	class attributes below describe what a format can do.
 	"""
 
+	# 'person' or 'event'.  Entries are converted to this kind on output.
+	kind = None
+
+	# load() yields entries before it has read all of its input.
+	streaming_load = False
+
+	# dump() writes entries as they come instead of collecting them first.
+	streaming_dump = False
+
+	@classmethod
+	def implements(cls, method):
+		"""Check whether this format overrides ``'load'`` or ``'dump'``."""
+		func = getattr(cls, method).__func__
+		return func is not getattr(Format, method).__func__
+
 	@classmethod
 	def load(cls, fh):  # pragma: nocover
 		raise NotImplementedError
@@ -212,43 +813,266 @@ class Format(object):
 		raise NotImplementedError
 
 	@classmethod
-	def dumps(cls, data):
+	def dumps(cls, data, **kwargs):
 		fh = BytesIO()
-		cls.dump(data, fh)
+		cls.dump(data, fh, **kwargs)
 		return fh.getvalue()
 
+	# Name of an optional module that is imported on first use, see
+	# import_backend().
+	backend = None
+
+	# A compiled bytes pattern that matches between two records.  Formats
+	# that set this can be split into independent chunks, see split().
+	boundary = None
+
+	# True if dumping two lists one after the other gives the same result
+	# as dumping them together.  Output in this format can be updated by
+	# truncating and appending, see write_synced().
+	appendable = False
+
+	@classmethod
+	def split(cls, fh, size=None):
+		"""Split a bytes stream into chunks of roughly `size` bytes.
+
+		Each chunk ends at a match of :py:attr:`boundary`, so the chunks can
+		be parsed independently of each other with :py:meth:`loads`.
+		"""
+		if cls.boundary is None:
+			raise NotImplementedError
+		if size is None:
+			size = SPLIT_SIZE
+
+		if isinstance(fh, MappedFile):
+			for start, end in cls.split_offsets(fh.buffer, size, fh.pos, fh.end):
+				yield fh.buffer[start:end]
+			fh.pos = fh.end
+			return
+
+		rest = b''
+		while True:
+			data = fh.read(size)
+			if not data:
+				break
+			# the leftover is searched again because a lookahead in the
+			# boundary may not have had enough data before
+			rest += data
+			pos = 0
+			for m in cls.boundary.finditer(rest):
+				pos = m.end()
+			if pos:
+				yield rest[:pos]
+				rest = rest[pos:]
+		if rest:
+			yield rest
+
+	@classmethod
+	def preamble(cls, buf):
+		"""Return the parts of `buf` that other chunks need to be loaded.
+
+		Chunks from :py:meth:`split` are loaded on their own, so this is
+		prepended to them, e.g. the timezone definitions of a calendar.
+		"""
+		return b''
+
+	@classmethod
+	def cache_key(cls, filename):
+		"""Return what the entries of `filename` depend on besides the file.
+
+		:py:class:`ParseCache` adds this to the key of the file, e.g. the
+		files included by a calendar.
+		"""
+		return None
+
+	@classmethod
+	def split_offsets(cls, buf, size=None, start=0, end=None):
+		"""Like :py:meth:`split`, but yield ``(start, end)`` offsets.
+
+		This searches a buffer (e.g. a memory map) for boundaries without
+		copying any data.
+		"""
+		if cls.boundary is None:
+			raise NotImplementedError
+		if size is None:
+			size = SPLIT_SIZE
+		if end is None:
+			end = len(buf)
+
+		while start < end:
+			m = cls.boundary.search(buf, min(start + size, end), end)
+			pos = end if m is None else m.end()
+			yield start, pos
+			start = pos
+
 
 class BSDCal(Format):
+	kind = 'event'
+	streaming_load = True
+	streaming_dump = True
+
 	@classmethod
 	def dump(cls, data, fh):
-		_fh = codecs.getwriter('utf8')(fh)
-		for item in data:
-			if 'dtstart' in item and 'summary' in item:
-				dt = item.first('dtstart')
-				if 'yearly' in item['freq']:
-					_fh.write('%s\t%s\n' % (dt.strftime('%m/%d*'), item.join('summary')))
-				elif dt.year == datetime.today().year:
-					_fh.write('%s\t%s\n' % (dt.strftime('%m/%d'), item.join('summary')))
+		year = datetime.today().year
+		with _text_writer(fh) as _fh:
+			for item in data:
+				if 'dtstart' in item and 'summary' in item:
+					dt = item.first('dtstart')
+					summary = item.join('summary').replace('\n', '\n\t')
+					if 'yearly' in item['freq']:
+						yearly = '*'
+					elif dt.year == year:
+						yearly = ''
+					else:
+						continue
+					_fh.write('%s/%s%s\t%s\n' % (_TWO_DIGITS[dt.month],
+						_TWO_DIGITS[dt.day], yearly, summary))
+
+	pattern = re.compile(br"""(?:
+		(\d\d?)/(\d\d?)
+		| ([A-Za-z]{3})[A-Za-z]*\.?[ ](\d\d?)
+		| (\d\d?)[ ]([A-Za-z]{3})[A-Za-z]*\.?
+	)(\*?)\t(.*)
+	| \t(.*)
+	| \#include[ \t]+[<"]([^>"]+)[>"]""", re.VERBOSE)
+	include = re.compile(br'^\#include[ \t]+[<"]([^>"]+)[>"]', re.MULTILINE)
+
+	months = dict((name, i + 1) for i, name in enumerate([
+		b'jan', b'feb', b'mar', b'apr', b'may', b'jun',
+		b'jul', b'aug', b'sep', b'oct', b'nov', b'dec']))
+
+	include_path = ['/usr/share/calendar']
+	chunk_size = 2 ** 16
+	boundary = re.compile(b'\n(?=[^\t])')
+	appendable = True
 
 	@classmethod
-	def load(cls, fh):
-		# Reads only a subset of bsdcal syntax!
-		year = datetime.today().year
-		for line in fh:
-			m = re.match(b'(\d\d)\/(\d\d)(\*?)\t(.*)', line.rstrip())
-			if m:
-				month, day, yearly, summary = m.groups()
+	def _date(cls, year, month, day, mname, mday, dday, dname):
+		if month is not None:
+			month, day = int(month), int(day)
+		elif mname is not None:
+			month, day = cls.months.get(mname.lower()), int(mday)
+		else:
+			month, day = cls.months.get(dname.lower()), int(dday)
+		try:
+			return datetime(year, month, day)
+		except (TypeError, ValueError):
+			return None
+
+	@classmethod
+	def _include(cls, name, including=None):
+		name = name.decode('utf8')
+		path = list(cls.include_path)
+		if including is not None:
+			path.insert(0, os.path.dirname(including))
+		for dirname in path:
+			filename = os.path.join(dirname, name)
+			if os.path.isfile(filename):
+				return os.path.abspath(filename)
+
+	@classmethod
+	def _chunks(cls, fh):
+		"""Yield lists of complete lines."""
+		rest = b''
+		while True:
+			data = fh.read(cls.chunk_size)
+			if not data:
+				if rest:
+					yield [rest]
+				break
+			lines = (rest + data).split(b'\n')
+			rest = lines.pop()
+			yield lines
+
+	@classmethod
+	def _entry(cls, dt, summary, yearly):
+		if len(summary) == 1:
+			summary = summary[0].rstrip().decode('utf8')
+		else:
+			summary = b'\n'.join(s.rstrip() for s in summary).decode('utf8')
+		mdict = MultiDict()
+		mdict['dtstart'] = [dt]
+		mdict['summary'] = [summary]
+		if yearly:
+			mdict['freq'] = ['yearly']
+		return mdict
 
-				mdict = MultiDict()
-				mdict['dtstart'] = [datetime(year, int(month), int(day))]
-				mdict['summary'] = [summary.decode('utf8')]
-				if yearly == b'*':
-					mdict['freq'] = ['yearly']
+	@classmethod
+	def cache_key(cls, filename):
+		# dates without a year are in the current one
+		key = [datetime.today().year]
+		todo = [os.path.abspath(filename)]
+		seen = set(todo)
+		while todo:
+			filename = todo.pop(0)
+			with open(filename, 'rb') as fh:
+				names = cls.include.findall(fh.read())
+			for name in names:
+				included = cls._include(name, filename)
+				if included is not None and included not in seen:
+					seen.add(included)
+					todo.append(included)
+					stat = os.stat(included)
+					key.append((included, stat.st_size,
+						getattr(stat, 'st_mtime_ns', stat.st_mtime)))
+		return key
 
-				yield mdict
+	@classmethod
+	def load(cls, fh, _included=()):
+		# Reads only a subset of bsdcal syntax: numeric and named dates,
+		# tab-continued lines and #include.
+		year = datetime.today().year
+		match = cls.pattern.match
+		dates = {}
+		pending = None
+		name = None
+		if hasattr(fh, 'name') and hasattr(fh.name, 'split'):
+			name = os.path.abspath(fh.name)
+			_included += (name,)
+
+		for lines in cls._chunks(fh):
+			for line in lines:
+				m = match(line)
+				if m is None:
+					if pending is not None:
+						yield cls._entry(*pending)
+						pending = None
+					continue
+
+				groups = m.groups()
+				if groups[8] is not None:
+					if pending is not None:
+						pending[1].append(groups[8])
+					continue
+
+				if pending is not None:
+					yield cls._entry(*pending)
+					pending = None
+
+				if groups[9] is not None:
+					filename = cls._include(groups[9], name)
+					if filename is not None and filename not in _included:
+						with open(filename, 'rb') as _fh:
+							for item in cls.load(_fh, _included + (filename,)):
+								yield item
+					continue
+
+				key = groups[:6]
+				try:
+					dt = dates[key]
+				except KeyError:
+					dt = dates[key] = cls._date(year, *key)
+				if dt is not None:
+					pending = (dt, [groups[7]], groups[6])
+
+		if pending is not None:
+			yield cls._entry(*pending)
 
 
 class ICal(Format):
+	backend = 'icalendar'
+	kind = 'event'
+	streaming_load = True
+	streaming_dump = True
 	fields = {
 		'categories': 'tag',
 		'comment': 'comment',
@@ -261,14 +1085,79 @@ class ICal(Format):
 		'freq': 'freq',
 	}
 
+	boundary = re.compile(b'\n(?=BEGIN:VEVENT)', re.IGNORECASE)
+	vtimezone = re.compile(b'^BEGIN:VTIMEZONE\r?$.*?^END:VTIMEZONE\r?\n?',
+		re.IGNORECASE | re.MULTILINE | re.DOTALL)
+
+	@classmethod
+	def preamble(cls, buf):
+		return b''.join(m.group(0).rstrip(b'\r\n') + b'\n'
+			for m in cls.vtimezone.finditer(buf))
+
+	@classmethod
+	def _unfold(cls, fh):
+		"""Yield unfolded content lines from a bytes stream."""
+		parts = []
+		for line in fh:
+			line = line.rstrip(b'\r\n')
+			if line[:1] in [b' ', b'\t']:
+				parts.append(line[1:])
+			else:
+				if parts:
+					yield b''.join(parts)
+				parts = [line]
+		if parts:
+			yield b''.join(parts)
+
+	@classmethod
+	def _timezone(cls, block):
+		"""Build the TZID and tzinfo of a VTIMEZONE."""
+		icalendar = import_backend(cls.backend)
+		vtimezone = icalendar.Timezone.from_ical(b'\r\n'.join(block + [b'']))
+		return _str(vtimezone['TZID']), vtimezone.to_tz()
+
+	@classmethod
+	def _localize(cls, event, timezones):
+		"""Attach custom timezones to DTSTART and DTEND of `event`."""
+		for key in ['DTSTART', 'DTEND']:
+			prop = event.get(key)
+			if not hasattr(prop, 'params') or 'TZID' not in prop.params:
+				continue
+			tz = timezones.get(prop.params['TZID'])
+			if tz is not None and getattr(prop.dt, 'tzinfo', False) is None:
+				if hasattr(tz, 'localize'):
+					# pytz timezones must not be passed to replace()
+					prop.dt = tz.localize(prop.dt)
+				else:
+					prop.dt = prop.dt.replace(tzinfo=tz)
+
 	@classmethod
-	def _iter_events(cls, component):
-		if isinstance(component, icalendar.Event):
-			yield component
-		elif hasattr(component, 'subcomponents'):
-			for c in component.subcomponents:
-				for event in cls._iter_events(c):
+	def _iter_events(cls, fh):
+		"""Yield each VEVENT of a stream as soon as its END line is read.
+
+		VTIMEZONE definitions are converted once when they are read and
+		attached to the events that follow.  Events with a TZID that has
+		not been defined yet stay naive.
+		"""
+		icalendar = import_backend(cls.backend)
+		block = None
+		timezones = {}
+		for line in cls._unfold(fh):
+			name = line.upper()
+			if name in [b'BEGIN:VEVENT', b'BEGIN:VTIMEZONE']:
+				block = [line]
+			elif block is not None:
+				block.append(line)
+				if name == b'END:VTIMEZONE':
+					tzid, tz = cls._timezone(block)
+					timezones[tzid] = tz
+					block = None
+				elif name == b'END:VEVENT':
+					event = icalendar.Event.from_ical(b'\r\n'.join(block + [b'']))
+					if timezones:
+						cls._localize(event, timezones)
 					yield event
+					block = None
 
 	@classmethod
 	def _decode(cls, key, value):
@@ -287,12 +1176,9 @@ class ICal(Format):
 
 	@classmethod
 	def load(cls, fh):
-		if isinstance(icalendar, Exception):  # pragma: nocover
-			raise icalendar
-
-		calendar = icalendar.Calendar.from_ical(fh.read())
+		import_backend(cls.backend)
 
-		for event in cls._iter_events(calendar):
+		for event in cls._iter_events(fh):
 			d = MultiDict()
 			for key, value in event.items():
 				if key.lower() in cls.fields:
@@ -309,12 +1195,17 @@ class ICal(Format):
 
 	@classmethod
 	def dump(cls, data, fh):
-		if isinstance(icalendar, Exception):  # pragma: nocover
-			raise icalendar
+		icalendar = import_backend(cls.backend)
 
+		# The serialization of a calendar is the concatenation of its own
+		# properties, its subcomponents and the END line, so events can be
+		# written one at a time.
 		calendar = icalendar.Calendar()
 		calendar.add('prodid', '-//XI//NONSGML CCTOOL//')
 		calendar.add('version', '2.0')
+		header = calendar.to_ical()
+		footer = b'END:VCALENDAR\r\n'
+		fh.write(header[:-len(footer)])
 
 		for _event in data:
 			vevent = icalendar.Event()
@@ -326,81 +1217,534 @@ class ICal(Format):
 					else:
 						for value in event[key]:
 							vevent.add(key.upper(), value)
-			calendar.add_component(vevent)
+			fh.write(vevent.to_ical())
+			fh.flush()
 
-		fh.write(calendar.to_ical())
+		fh.write(footer)
 
 
 class ABook(Format):
+	kind = 'person'
+	streaming_load = True
+	streaming_dump = True
 	fields = dict((x, x) for x in [
 		'name', 'nick', 'bday', 'email', 'url', 'tag',
 		'address_lines', 'city', 'state', 'zip', 'country',
 		'phone', 'workphone', 'mobile',
 		'xmpp', 'icq', 'msn', 'twitter', 'pgp'])
 
+	option = re.compile(r'(.*?)\s*[=:]\s*(.*)$')
+	boundary = re.compile(b'\n(?=\\[)')
+
+	@classmethod
+	def _iter_sections(cls, fh):
+		"""Yield ``(section, items)`` as soon as each section is complete.
+
+		This understands the subset of the ini syntax that ConfigParser
+		reads: comments, ``key = value`` or ``key: value`` and indented
+		continuation lines.
+		"""
+		section = None
+		items = OrderedDict()
+		key = None
+		for line in fh:
+			line = line.decode('utf8').rstrip()
+			if not line or line[0] in '#;':
+				key = None
+			elif line[0] in ' \t':
+				if key is not None:
+					items[key] += '\n' + line.strip()
+			elif line[0] == '[' and ']' in line:
+				if section is not None:
+					yield section, items
+				section = line[1:line.rindex(']')]
+				items = OrderedDict()
+				key = None
+			elif section is not None:
+				m = cls.option.match(line)
+				if m:
+					key = m.group(1).lower()
+					items[key] = m.group(2)
+		if section is not None:
+			yield section, items
+
 	@classmethod
 	def load(cls, fh):
-		_fh = codecs.getreader('utf8')(fh)
-		config_parser = ConfigParser()
-		config_parser.readfp(_fh)
-		for section in config_parser.sections():
+		dates = {}
+		for section, items in cls._iter_sections(fh):
 			if section != 'format':
 				d = MultiDict()
-				for key, value in config_parser.items(section):
+				for key, value in items.items():
 					if key == 'bday':
-						if value[0] == '-':
-							value = '1900' + value[1:]
-						d[key] = [datetime.strptime(value, '%Y-%m-%d')]
+						if value not in dates:
+							_value = '1900' + value[1:] if value[0] == '-' else value
+							dates[value] = datetime.strptime(_value, '%Y-%m-%d')
+						d[key] = [dates[value]]
 					else:
 						d[key] = value.split(',')
 				yield map_keys(d, cls.fields)
 
 	@classmethod
 	def dump(cls, data, fh):
-		cp = ConfigParser()
-
-		if isinstance(cp.__module__, bytes):  # pragma: nocover
-			_fh = fh
-			encode = lambda x: x.encode('utf8')
-		else:  # pragma: nocover
-			_fh = codecs.getwriter('utf8')(fh)
-			encode = lambda x: x
-
-		def _set(cp, section, key, value):
-			cp.set(encode(section), encode(key), encode(value))
-
-		for i, _item in enumerate(data):
-			item = map_keys(_item, cls.fields, reverse=True)
-			section = _str(i)
-			cp.add_section(encode(section))
-			for key in item:
-				if key == 'bday':
-					dt = item.first(key)
-					if dt.year == 1900:
-						value = dt.strftime('--%m-%d')
+		# same output as RawConfigParser.write(), one section at a time
+		with _text_writer(fh) as _fh:
+			for i, item in enumerate(data):
+				lines = ['[%i]\n' % i]
+				for key in item:
+					if key not in item:
+						continue
+					elif key == 'bday':
+						dt = item.first(key)
+						value = _format_date(dt, dt.year != 1900)
+					elif key in cls.fields:
+						value = _str(item.join(key))
 					else:
-						value = dt.strftime('%Y-%m-%d')
-					_set(cp, section, key, value)
-				elif key in cls.fields:
-					_set(cp, section, key, item.join(key))
-		cp.write(_fh)
+						continue
+					lines.append('%s = %s\n' % (key, value.replace('\n', '\n\t')))
+				lines.append('\n')
+				_fh.write(''.join(lines))
 
 
 class LDIF(Format):
+	"""LDAP Data Interchange Format (RFC 2849).
+
+	Only the attributes in :py:attr:`fields` are read.  All other
+	attributes, e.g. large base64 encoded photos or certificates, are
+	skipped line by line without decoding them.
+
+	:py:meth:`dump` writes one record per entry as it arrives.  The DN is
+	built from a template like ``'cn={name},ou=people,dc=example,dc=com'``.
+	Entries where a field used in the template is missing or empty are
+	skipped.  With `changetype`, ``add``, ``modify`` (replacing all written
+	attributes) or ``delete`` change records are written instead of
+	content records.
+	"""
+
+	kind = 'person'
+	streaming_load = True
+	streaming_dump = True
 	fields = {
 		'cn': 'name',
 		'mail': 'email',
+		'homePhone': 'phone',
+		'telephoneNumber': 'workphone',
+		'mobile': 'mobile',
+		'o': 'org',
+		'street': 'address_lines',
+		'l': 'city',
+		'st': 'state',
+		'postalCode': 'zip',
+		'c': 'country',
 	}
 
+	# continuation lines start with a space
+	boundary = re.compile(b'\n\r?\n(?=[^ \r\n])')
+
+	# RFC 2849 SAFE-STRING, trailing spaces are also encoded to be safe
+	safe = re.compile(r'[\x01-\x09\x0b\x0c\x0e-\x1f\x21-\x39\x3b\x3d-\x7f]'
+		r'[\x01-\x09\x0b\x0c\x0e-\x7f]*(?<! )\Z')
+	template = re.compile(r'\{(\w+)\}')
+	changetypes = ['add', 'modify', 'delete']
+	width = 76
+
+	@classmethod
+	def _line(cls, attr, value):
+		if cls.safe.match(value):
+			line = '%s: %s' % (attr, value)
+		else:
+			value = base64.b64encode(value.encode('utf8')).decode('ascii')
+			line = '%s:: %s' % (attr, value)
+		if len(line) <= cls.width:
+			return line + '\n'
+		# lines are pure ASCII at this point, so they can be folded anywhere
+		step = cls.width - 1
+		return '\n '.join([line[:cls.width]] + [line[i:i + step]
+			for i in range(cls.width, len(line), step)]) + '\n'
+
+	@classmethod
+	def _escape_dn(cls, value):
+		"""Escape an attribute value for use in a DN (RFC 4514)."""
+		value = re.sub(r'([\\,+"<>;=])', r'\\\1', value)
+		if value[:1] in ['#', ' ']:
+			value = '\\' + value
+		if value[-1:] == ' ':
+			value = value[:-1] + '\\ '
+		return value
+
+	@classmethod
+	def _dn_value(cls, entry, key):
+		value = entry.first(key)
+		if isinstance(value, date):
+			value = _format_date(value)
+		value = _str(value).strip()
+		if not value:
+			raise KeyError(key)
+		return value
+
+	@classmethod
+	def dump(cls, data, fh, dn='cn={name}', changetype=None,
+			objectclass=('inetOrgPerson',)):
+		if changetype is not None and changetype not in cls.changetypes:
+			raise ValueError('Unknown changetype: %s' % changetype)
+		attrs = dict((v, k) for k, v in cls.fields.items())
+
+		with _text_writer(fh) as _fh:
+			_fh.write('version: 1\n')
+			for entry in data:
+				try:
+					_dn = cls.template.sub(
+						lambda m: cls._escape_dn(cls._dn_value(entry, m.group(1))), dn)
+				except KeyError:
+					continue
+
+				lines = ['\n', cls._line('dn', _dn)]
+				if changetype is not None:
+					lines.append(cls._line('changetype', changetype))
+				if changetype in [None, 'add']:
+					for value in objectclass:
+						lines.append(cls._line('objectClass', value))
+					name = _str(entry.first('name', '')).strip()
+					if name:
+						# required by the person object class.  There is no
+						# reliable way to find the surname in a full name.
+						lines.append(cls._line('sn', name))
+
+				if changetype != 'delete':
+					for key in entry:
+						if key in attrs:
+							values = [_str(v) for v in entry[key] if _str(v)]
+							if not values:
+								continue
+							if changetype == 'modify':
+								lines.append(cls._line('replace', attrs[key]))
+							for value in values:
+								lines.append(cls._line(attrs[key], value))
+							if changetype == 'modify':
+								lines.append('-\n')
+				_fh.write(''.join(lines))
+
+	@classmethod
+	def _value(cls, parts):
+		value = b''.join(parts)
+		if value[:1] == b':':
+			value = base64.b64decode(value[1:].strip())
+		elif value[:1] == b'<':
+			# values may be loaded from URLs, which is not supported
+			return None
+		else:
+			value = value.lstrip(b' ')
+		return value.decode('utf8', 'replace')
+
 	@classmethod
 	def load(cls, fh):
-		if isinstance(ldif3, Exception):
-			raise ldif3
+		fields = dict((k.lower().encode('ascii'), v)
+			for k, v in cls.fields.items())
+
+		entry = None
+		field = None
+		parts = None
+		first = True
+		for line in fh:
+			if line[:1] == b' ':
+				if parts is not None:
+					parts.append(line[1:].rstrip(b'\r\n'))
+				continue
+
+			if parts is not None:
+				value = cls._value(parts)
+				if value:
+					entry.append(field, [value])
+				parts = None
+
+			line = line.rstrip(b'\r\n')
+			if not line:
+				if entry is not None:
+					yield entry
+					entry = None
+			elif line[:1] != b'#' and line != b'-':
+				name, _, value = line.partition(b':')
+				# strip attribute options like in "cn;lang-de"
+				key = name.split(b';', 1)[0].lower()
+				if first and key == b'version':
+					continue
+				first = False
+				if entry is None:
+					entry = MultiDict()
+				field = fields.get(key)
+				if field is not None:
+					parts = [value]
+
+		if parts is not None:
+			value = cls._value(parts)
+			if value:
+				entry.append(field, [value])
+		if entry is not None:
+			yield entry
+
+
+class VCard(Format):
+	"""vCard (RFC 2426 and RFC 6350, reading also vCard 2.1).
+
+	Cards are parsed one at a time, so large address books can be
+	streamed and split for ``--jobs``.  Only the properties in
+	:py:attr:`fields` are decoded.  TEL is mapped to 'phone',
+	'workphone' or 'mobile' depending on its types and the components of
+	ADR to the address fields.  The name is taken from N if there is no FN.
+	:py:meth:`dump` writes vCard 3.0.
+	"""
+
+	kind = 'person'
+	streaming_load = True
+	streaming_dump = True
+	appendable = True
+	fields = {
+		'FN': 'name',
+		'NICKNAME': 'nick',
+		'BDAY': 'bday',
+		'EMAIL': 'email',
+		'TEL': 'phone',
+		'ADR': 'address_lines',
+		'ORG': 'org',
+		'URL': 'url',
+		'CATEGORIES': 'tag',
+		'NOTE': 'comment',
+		'IMPP': 'xmpp',
+		'X-JABBER': 'xmpp',
+		'X-ICQ': 'icq',
+		'X-MSN': 'msn',
+		'X-TWITTER': 'twitter',
+	}
+	lists = ['nick', 'tag']
+	address = ['address_lines', 'city', 'state', 'zip', 'country']
+	impp = {'xmpp': 'xmpp', 'icq': 'icq', 'msnim': 'msn'}
+
+	boundary = re.compile(b'\n(?=BEGIN:VCARD)', re.IGNORECASE)
+	prop = re.compile(
+		br'(?:[A-Za-z0-9-]+\.)?([A-Za-z0-9-]+)((?:;(?:[^";:]|"[^"]*")*)*):')
+	charset = re.compile(br';CHARSET=([\w-]+)', re.IGNORECASE)
+	escaped = re.compile(r'(\\.|[,;])')
+	width = 75
+
+	@classmethod
+	def _unfold(cls, fh):
+		"""Yield unfolded content lines from a bytes stream.
+
+		Also joins vCard 2.1 quoted-printable soft line breaks.
+		"""
+		parts = []
+		soft = False
+		for line in fh:
+			line = line.rstrip(b'\r\n')
+			if soft:
+				parts[-1] = parts[-1][:-1]
+				parts.append(line)
+			elif line[:1] in [b' ', b'\t']:
+				parts.append(line[1:])
+			else:
+				if parts:
+					yield b''.join(parts)
+				parts = [line]
+			soft = line[-1:] == b'=' and (
+				b'QUOTED-PRINTABLE' in parts[0].split(b':', 1)[0].upper())
+		if parts:
+			yield b''.join(parts)
+
+	@classmethod
+	def _decode(cls, params, value):
+		if b'QUOTED-PRINTABLE' in params.upper():
+			value = quopri.decodestring(value)
+		m = cls.charset.search(params)
+		if m:
+			try:
+				return value.decode(m.group(1).decode('ascii'), 'replace')
+			except LookupError:
+				pass
+		return value.decode('utf8', 'replace')
+
+	@classmethod
+	def _split(cls, value, sep=None):
+		"""Split `value` at unescaped `sep` and unescape the parts."""
+		if '\\' not in value and (sep is None or sep not in value):
+			return [value]
+		parts = ['']
+		for i, token in enumerate(cls.escaped.split(value)):
+			if i % 2 == 0:
+				parts[-1] += token
+			elif token == sep:
+				parts.append('')
+			elif token in ['\\n', '\\N']:
+				parts[-1] += '\n'
+			else:
+				parts[-1] += token[-1]
+		return parts
+
+	@classmethod
+	def _types(cls, params):
+		types = set()
+		for param in params.upper().split(b';')[1:]:
+			key, eq, value = param.partition(b'=')
+			if not eq:
+				# vCard 2.1 allows bare types like "TEL;CELL:"
+				types.add(key)
+			elif key == b'TYPE':
+				types.update(value.strip(b'"').split(b','))
+		return types
+
+	@classmethod
+	def _date(cls, value):
+		value = value.strip().split('T', 1)[0].replace('-', '')
+		if len(value) == 4:
+			# "--MMDD", without a year
+			value = '1900' + value
+		return datetime.strptime(value, '%Y%m%d')
+
+	@classmethod
+	def load(cls, fh):
+		fields = dict((k.encode('ascii'), v) for k, v in cls.fields.items())
+		dates = {}
+
+		entry = None
+		for line in cls._unfold(fh):
+			m = cls.prop.match(line)
+			if m is None:
+				continue
+			name = m.group(1).upper()
+			if name == b'BEGIN' and line[m.end():].upper() == b'VCARD':
+				entry = MultiDict()
+				structured = None
+			elif entry is None:
+				continue
+			elif name == b'END' and line[m.end():].upper() == b'VCARD':
+				if structured and 'name' not in entry:
+					entry.append('name', [structured])
+				yield entry
+				entry = None
+			elif name == b'N':
+				# only used if there is no FN, which is optional in vCard 2.1
+				parts = cls._split(cls._decode(m.group(2), line[m.end():]), ';')
+				# family; given; additional; prefixes; suffixes
+				structured = ' '.join(p for p in parts[1:2] + parts[:1] if p)
+			elif name in fields:
+				field = fields[name]
+				params = m.group(2)
+				value = cls._decode(params, line[m.end():])
+
+				if name == b'TEL':
+					types = cls._types(params)
+					if b'CELL' in types:
+						field = 'mobile'
+					elif b'WORK' in types:
+						field = 'workphone'
+					elif b'FAX' in types and b'VOICE' not in types:
+						continue
+					if value[:4].lower() == 'tel:':
+						value = value[4:]
+					values = [value]
+				elif name == b'ADR':
+					# post office box; extended address; street; locality;
+					# region; postal code; country
+					parts = cls._split(value, ';')[2:7] or ['']
+					lines = [s for s in parts[0].split('\n') if s]
+					if lines:
+						entry.append(field, lines)
+					for key, _value in zip(cls.address[1:], parts[1:]):
+						if _value:
+							entry.append(key, [_value])
+					continue
+				elif name == b'BDAY':
+					if value not in dates:
+						try:
+							dates[value] = cls._date(value)
+						except ValueError:
+							dates[value] = None
+					values = [dates[value]] if dates[value] else []
+				elif name == b'IMPP':
+					scheme, _, value = value.partition(':')
+					if scheme.lower() not in cls.impp:
+						continue
+					field = cls.impp[scheme.lower()]
+					values = [value]
+				elif name == b'ORG':
+					values = cls._split(value, ';')[:1]
+				elif field in cls.lists:
+					values = cls._split(value, ',')
+				else:
+					values = cls._split(value)
+
+				values = [v for v in values if v]
+				if values:
+					entry.append(field, values)
+
+	@classmethod
+	def _escape(cls, value):
+		return (_str(value).replace('\\', '\\\\').replace('\n', '\\n')
+			.replace(',', '\\,').replace(';', '\\;'))
 
-		parser = ldif3.LDIFParser(fh, strict=False)
+	@classmethod
+	def _line(cls, line):
+		line = line.encode('utf8')
+		chunks = []
+		start = 0
+		width = cls.width
+		while len(line) - start > width:
+			end = start + width
+			# do not fold in the middle of a UTF-8 sequence
+			while 0x80 <= bytearray(line[end:end + 1])[0] < 0xc0:
+				end -= 1
+			chunks.append(line[start:end])
+			start = end
+			width = cls.width - 1
+		chunks.append(line[start:])
+		return b'\r\n '.join(chunks) + b'\r\n'
 
-		for dn, entry in parser.parse():
-			yield map_keys(MultiDict(entry), cls.fields)
+	@classmethod
+	def dump(cls, data, fh):
+		escape = cls._escape
+		for entry in data:
+			name = _str(entry.first('name', ''))
+			given, _, family = name.rpartition(' ')
+			lines = [
+				'BEGIN:VCARD',
+				'VERSION:3.0',
+				'FN:' + escape(name),
+				'N:%s;%s;;;' % (escape(family), escape(given)),
+			]
+			if 'nick' in entry:
+				lines.append('NICKNAME:' + ','.join(map(escape, entry['nick'])))
+			if 'bday' in entry:
+				dt = entry.first('bday')
+				lines.append('BDAY:' + _format_date(dt, dt.year != 1900))
+			for value in entry['email']:
+				lines.append('EMAIL;TYPE=INTERNET:' + escape(value))
+			for key, types in [
+				('phone', 'HOME,VOICE'),
+				('workphone', 'WORK,VOICE'),
+				('mobile', 'CELL'),
+			]:
+				for value in entry[key]:
+					lines.append('TEL;TYPE=%s:%s' % (types, escape(value)))
+			if any(key in entry for key in cls.address):
+				lines.append('ADR;TYPE=HOME:;;' + ';'.join(
+					[escape('\n'.join(map(_str, entry['address_lines'])))] +
+					[escape(entry.first(key, '')) for key in cls.address[1:]]))
+			if 'org' in entry:
+				lines.append('ORG:' + escape(entry.first('org')))
+			for value in entry['url']:
+				lines.append('URL:' + _str(value))
+			if 'tag' in entry:
+				lines.append('CATEGORIES:' + ','.join(map(escape, entry['tag'])))
+			if 'comment' in entry:
+				lines.append('NOTE:' + escape(entry.join('comment', sep='\n')))
+			for key, prop in [
+				('xmpp', 'X-JABBER'),
+				('icq', 'X-ICQ'),
+				('msn', 'X-MSN'),
+				('twitter', 'X-TWITTER'),
+			]:
+				for value in entry[key]:
+					lines.append('%s:%s' % (prop, escape(value)))
+			lines.append('END:VCARD')
+			fh.write(b''.join(cls._line(line) for line in lines))
 
 
 class DateTimeJSONEncoder(json.JSONEncoder):
@@ -412,6 +1756,11 @@ class DateTimeJSONEncoder(json.JSONEncoder):
 
 
 class JSON(Format):
+	streaming_dump = True
+
+	# ', ' in python 2, ',' in python 3
+	separator = json.JSONEncoder(indent=4).item_separator
+
 	@classmethod
 	def load(cls, fh):
 		_fh = codecs.getreader('utf8')(fh)
@@ -419,25 +1768,247 @@ class JSON(Format):
 
 	@classmethod
 	def dump(cls, data, fh):
-		_fh = codecs.getwriter('utf8')(fh)
-		json.dump(list(data), _fh, indent=4, cls=DateTimeJSONEncoder)
+		# same output as ``json.dump(list(data), indent=4)``, but streamed
+		with _text_writer(fh) as _fh:
+			sep = '['
+			for item in data:
+				s = json.dumps(item, indent=4, cls=DateTimeJSONEncoder)
+				_fh.write(sep + '\n    ' + s.replace('\n', '\n    '))
+				sep = cls.separator
+			_fh.write('[]' if sep == '[' else '\n]')
+
+
+def _parse_date(s):
+	"""Reverse of :py:class:`DateTimeJSONEncoder` for a single value."""
+	if len(s) == 10:
+		fmts = ['%Y-%m-%d']
+	elif len(s) in [19, 26]:
+		fmts = ['%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f']
+	else:
+		fmts = ['%Y-%m-%dT%H:%M:%S%z', '%Y-%m-%dT%H:%M:%S.%f%z']
+	for fmt in fmts:
+		try:
+			dt = datetime.strptime(s, fmt)
+		except ValueError:
+			continue
+		return dt.date() if len(s) == 10 else dt
+	return s
+
+
+class JSONLines(Format):
+	"""One JSON object per line.
+
+	Values of the fields in :py:data:`DATE_FIELDS` are converted back to
+	dates when loading.
+	"""
+
+	streaming_load = True
+	streaming_dump = True
+	boundary = re.compile(b'\n')
+	appendable = True
+
+	# keep the order of fields where dicts are not ordered
+	object_pairs_hook = None if _dict is dict else _dict
+
+	@classmethod
+	def load(cls, fh):
+		for line in fh:
+			line = line.strip()
+			if line:
+				d = MultiDict(json.loads(
+					line.decode('utf8'), object_pairs_hook=cls.object_pairs_hook))
+				for key in DATE_FIELDS:
+					if key in d:
+						d[key] = [_parse_date(v) if hasattr(v, 'split') else v
+							for v in d[key]]
+				yield d
+
+	@classmethod
+	def dump(cls, data, fh):
+		for item in data:
+			s = json.dumps(item, cls=DateTimeJSONEncoder, ensure_ascii=False,
+				separators=(',', ':'))
+			fh.write(s.encode('utf8') + b'\n')
+
+
+class CSV(Format):
+	"""Comma separated values with a header row.
+
+	Columns are mapped to fields by their lowercased header, with a few
+	common aliases in :py:attr:`fields`.  Multiple values share a cell
+	separated by commas, like :py:meth:`MultiDict.join` writes them.
+
+	Rows are converted in batches of :py:attr:`batch_size`, one column at
+	a time.  :py:meth:`dump` takes the header from the fields of the first
+	batch.  If that contains persons or events, all other fields of that
+	kind are added as well.  Unknown fields that only appear later can not
+	be written and are reported on stderr.
+	"""
+
+	streaming_load = True
+	streaming_dump = True
+	delimiter = ','
+	batch_size = 10000
+	fields = {
+		'e-mail': 'email',
+		'birthday': 'bday',
+		'nickname': 'nick',
+		'street': 'address_lines',
+		'address': 'address_lines',
+		'postal code': 'zip',
+		'organization': 'org',
+		'tags': 'tag',
+		'categories': 'tag',
+		'notes': 'comment',
+		'start': 'dtstart',
+		'end': 'dtend',
+	}
+
+	@classmethod
+	def _field(cls, header):
+		key = header.strip().lower()
+		return cls.fields.get(key, key)
+
+	@classmethod
+	def _batches(cls, fh):
+		"""Yield the header and then lists of columns."""
+		if bytes is str:  # pragma: nocover
+			# the python 2 csv module only works with bytes
+			reader = ([cell.decode('utf8') for cell in row]
+				for row in csv.reader(fh, delimiter=str(cls.delimiter)))
+		else:
+			reader = csv.reader((line.decode('utf8') for line in fh),
+				delimiter=cls.delimiter)
+		header = next(reader, None)
+		if header is None:
+			return
+		yield header
+		width = len(header)
+		while True:
+			rows = list(itertools.islice(reader, cls.batch_size))
+			if not rows:
+				break
+			for i, row in enumerate(rows):
+				if len(row) != width:
+					rows[i] = (row + [''] * width)[:width]
+			yield [list(column) for column in zip(*rows)]
+
+	@classmethod
+	def load(cls, fh):
+		batches = cls._batches(fh)
+		header = next(batches, None)
+		if header is None:
+			return
+		keys = [cls._field(h.lstrip('\ufeff')) for h in header]
+		unique = len(set(keys)) == len(keys)
+		dates = {}
+
+		for columns in batches:
+			for i, key in enumerate(keys):
+				if key in DATE_FIELDS:
+					for value in set(columns[i]):
+						if value not in dates:
+							dates[value] = _parse_date(value)
+					columns[i] = [[dates[value]] if value else None
+						for value in columns[i]]
+				else:
+					columns[i] = [value.split(',') if value else None
+						for value in columns[i]]
+
+			for values in zip(*columns):
+				if unique:
+					yield MultiDict([(key, value) for key, value
+						in zip(keys, values) if value is not None])
+				else:
+					entry = MultiDict()
+					for key, value in zip(keys, values):
+						if value is not None:
+							entry.append(key, value)
+					yield entry
+
+	@classmethod
+	def _format(cls, value):
+		if isinstance(value, date):
+			return value.isoformat()
+		return _str(value)
+
+	@classmethod
+	def _header(cls, batch):
+		keys = _dict((key, None) for entry in batch for key in entry)
+		for fields in [PERSON_FIELDS, EVENT_FIELDS]:
+			if any(key in keys for key in fields):
+				keys.update((key, None) for key in fields + GENERIC_FIELDS)
+		return list(keys)
+
+	@classmethod
+	def _column(cls, batch, key):
+		values = [_dict.get(entry, key) or () for entry in batch]
+		try:
+			return [','.join(v) for v in values]
+		except TypeError:
+			# dates or numbers somewhere in the column
+			return [','.join(map(cls._format, v)) for v in values]
+
+	@classmethod
+	def dump(cls, data, fh):
+		data = iter(data)
+		batch = list(itertools.islice(data, cls.batch_size))
+		if not batch:
+			return
+		keys = cls._header(batch)
+		header = set(keys)
+		dropped = set()
+
+		with _text_writer(fh) as _fh:
+			if bytes is str:  # pragma: nocover
+				# the python 2 csv module only works with bytes
+				writer = csv.writer(fh, delimiter=str(cls.delimiter))
+				writerows = lambda rows: writer.writerows(
+					[cell.encode('utf8') for cell in row] for row in rows)
+			else:
+				writerows = csv.writer(_fh, delimiter=cls.delimiter).writerows
+			writerows([keys])
+			while batch:
+				writerows(zip(*[cls._column(batch, key) for key in keys]))
+				for entry in batch:
+					if not header.issuperset(entry):
+						dropped.update(key for key in entry
+							if key not in header and key in entry)
+				batch = list(itertools.islice(data, cls.batch_size))
+
+		if dropped:
+			print('Fields missing from the header were not written: %s' %
+				', '.join(sorted(dropped)), file=sys.stderr)
+
+
+class TSV(CSV):
+	"""Tab separated values, see :py:class:`CSV`."""
+
+	delimiter = '\t'
 
 
 class YAML(Format):
+	backend = 'yaml'
+	streaming_dump = True
+
 	@classmethod
 	def load(cls, fh):
-		if isinstance(yaml, Exception):  # pragma: nocover
-			raise yaml
+		yaml = import_backend(cls.backend)
 
-		return [MultiDict(d) for d in yaml.safe_load(fh.read())]
+		return [MultiDict(d) for d in yaml.safe_load(fh)]
 
 	@classmethod
 	def dump(cls, data, fh):
-		if isinstance(yaml, Exception):  # pragma: nocover
-			raise yaml
+		yaml = import_backend(cls.backend)
 
-		_fh = codecs.getwriter('utf8')(fh)
-		_fh.write(yaml.safe_dump([dict(d) for d in data]))
+		# a YAML list can be written one item at a time
+		with _text_writer(fh) as _fh:
+			empty = True
+			for d in data:
+				_fh.write(yaml.safe_dump([dict(d)]))
+				empty = False
+			if empty:
+				_fh.write(yaml.safe_dump([]))
 
 
 class Pickle(Format):
@@ -447,36 +2018,418 @@ class Pickle(Format):
 
 	@classmethod
 	def dump(cls, data, fh):
-		pickle.dump(data, fh)
+		pickle.dump(list(data), fh)
+
+
+_VARINT = [struct.pack('B', i) for i in range(0x80)]
+
+
+def _varint(n):
+	if n < 0x80:
+		return _VARINT[n]
+	buf = bytearray()
+	while n >= 0x80:
+		buf.append((n & 0x7f) | 0x80)
+		n >>= 7
+	buf.append(n)
+	return bytes(buf)
+
+
+def _read_varint(buf, pos):
+	try:
+		b = buf[pos]
+		if b < 0x80:
+			return b, pos + 1
+		n = b & 0x7f
+		shift = 7
+		while True:
+			pos += 1
+			b = buf[pos]
+			n |= (b & 0x7f) << shift
+			if b < 0x80:
+				return n, pos + 1
+			shift += 7
+	except IndexError:
+		raise ValueError('Truncated record')
+
+
+class Records(Format):
+	"""Length-prefixed binary records.
+
+	The file starts with :py:attr:`magic`, followed by one record per entry
+	and a zero byte.  Each record is a varint length followed by the number
+	of fields and, for each field, a key reference, the number of values
+	and the tagged values.  Keys are interned: the first use of a key is
+	written as ``0`` followed by the key itself, later uses refer to it by
+	number.  Dates and datetimes are stored as day ordinals and
+	microseconds, so reading is safe even on untrusted input.
+
+	Unless ``index=False`` is passed to :py:meth:`dump`, the records are
+	followed by a table of all keys, the offset of every record and a fixed
+	size trailer, so that :py:class:`RecordReader` can access any record
+	directly.
+	"""
+
+	streaming_load = True
+	streaming_dump = True
+
+	magic = b'CCREC\x01'
+	trailer = struct.Struct(str('<QQQ4s'))
+	chunk_size = 2 ** 16
+
+	# Each value starts with a varint whose lowest three bits are the type
+	# and whose other bits are the length, the day ordinal or the number.
+	STR, DATE, DATETIME, DATETIME_TZ, INT, FLOAT, CONST, BYTES = range(8)
+	CONSTS = [None, True, False]
+
+	@classmethod
+	def _encode_value(cls, value):
+		t = type(value)
+		if t is _text or isinstance(value, _text):
+			b = value.encode('utf8')
+			return _varint(len(b) << 3) + b
+		elif t is datetime or isinstance(value, datetime):
+			usec = ((value.hour * 60 + value.minute) * 60 + value.second) * \
+				1000000 + value.microsecond
+			offset = value.utcoffset()
+			if offset is None:
+				return _varint(value.toordinal() << 3 | cls.DATETIME) + _varint(usec)
+			seconds = offset.days * 86400 + offset.seconds
+			zigzag = seconds * 2 if seconds >= 0 else -seconds * 2 - 1
+			return (_varint(value.toordinal() << 3 | cls.DATETIME_TZ) +
+				_varint(usec) + _varint(zigzag))
+		elif t is date or isinstance(value, date):
+			return _varint(value.toordinal() << 3 | cls.DATE)
+		elif value is None or value is True or value is False:
+			return _varint(cls.CONSTS.index(value) << 3 | cls.CONST)
+		elif isinstance(value, _integer):
+			zigzag = value * 2 if value >= 0 else -value * 2 - 1
+			return _varint(zigzag << 3 | cls.INT)
+		elif isinstance(value, float):
+			return _varint(cls.FLOAT) + struct.pack(str('<d'), value)
+		elif isinstance(value, bytes):
+			return _varint(len(value) << 3 | cls.BYTES) + value
+		else:
+			raise TypeError('Unsupported value: %r' % value)
+
+	@classmethod
+	def encode(cls, entry, keys):
+		"""Encode a single record.  `keys` maps interned keys to numbers."""
+		parts = [_varint(len(entry))]
+		for key, values in entry.items():
+			k = keys.get(key)
+			if k is None:
+				k = keys[key] = len(keys) + 1
+				b = key.encode('utf8')
+				parts += [_VARINT[0], _varint(len(b)), b]
+			else:
+				parts.append(_varint(k))
+			parts.append(_varint(len(values)))
+			for value in values:
+				parts.append(cls._encode_value(value))
+		payload = b''.join(parts)
+		return _varint(len(payload)) + payload
+
+	@classmethod
+	def _decode_value(cls, buf, pos, v, cache):
+		tag = v & 7
+		if tag == cls.DATE:
+			value = cache.get(v)
+			if value is None:
+				value = cache[v] = date.fromordinal(v >> 3)
+			return value, pos
+		elif tag == cls.DATETIME or tag == cls.DATETIME_TZ:
+			usec, pos = _read_varint(buf, pos)
+			zigzag = None
+			if tag == cls.DATETIME_TZ:
+				zigzag, pos = _read_varint(buf, pos)
+			key = (v, usec, zigzag)
+			value = cache.get(key)
+			if value is None:
+				value = datetime.fromordinal(v >> 3) + timedelta(microseconds=usec)
+				if zigzag is not None:
+					seconds = zigzag >> 1 if zigzag % 2 == 0 else -(zigzag >> 1) - 1
+					value = value.replace(tzinfo=timezone(timedelta(seconds=seconds)))
+				cache[key] = value
+			return value, pos
+		elif tag == cls.INT:
+			zigzag = v >> 3
+			return zigzag >> 1 if zigzag % 2 == 0 else -(zigzag >> 1) - 1, pos
+		elif tag == cls.FLOAT:
+			return struct.unpack_from(str('<d'), buf, pos)[0], pos + 8
+		elif tag == cls.CONST:
+			return cls.CONSTS[v >> 3], pos
+		else:
+			end = pos + (v >> 3)
+			return bytes(buf[pos:end]), end
+
+	@classmethod
+	def decode(cls, buf, pos, keys, define=True, cache=None):
+		"""Decode the record payload at `pos`.
+
+		`keys` is the list of interned keys.  New keys are appended to it
+		if `define` is true.  `cache` is used to share equal dates between
+		records.
+		"""
+		# short varints are by far the most common, so they are handled
+		# inline
+		if cache is None:
+			cache = {}
+		try:
+			n = buf[pos]
+			pos += 1
+			if n >= 0x80:
+				n, pos = _read_varint(buf, pos - 1)
+			entry = MultiDict()
+			for i in range(n):
+				k = buf[pos]
+				pos += 1
+				if k >= 0x80:
+					k, pos = _read_varint(buf, pos - 1)
+				if k:
+					key = keys[k - 1]
+				else:
+					length, pos = _read_varint(buf, pos)
+					key = buf[pos:pos + length].decode('utf8')
+					pos += length
+					if define:
+						keys.append(key)
+				count = buf[pos]
+				pos += 1
+				if count >= 0x80:
+					count, pos = _read_varint(buf, pos - 1)
+				values = []
+				for j in range(count):
+					v = buf[pos]
+					pos += 1
+					if v >= 0x80:
+						b = buf[pos]
+						if b < 0x80:
+							v = (v & 0x7f) | (b << 7)
+							pos += 1
+						else:
+							v, pos = _read_varint(buf, pos - 1)
+					if v & 7:
+						value, pos = cls._decode_value(buf, pos, v, cache)
+						values.append(value)
+					else:
+						end = pos + (v >> 3)
+						values.append(buf[pos:end].decode('utf8'))
+						pos = end
+				_dict.__setitem__(entry, key, values)
+		except (IndexError, struct.error):
+			# garbage or a record cut off in the middle
+			raise ValueError('Truncated record')
+		except OverflowError as err:
+			# dates out of range already raise ValueError, larger ones this
+			raise ValueError('Invalid record: %s' % err)
+		return entry
+
+	@classmethod
+	def load(cls, fh):
+		if fh.read(len(cls.magic)) != cls.magic:
+			raise ValueError('Not a record file')
+
+		keys = []
+		cache = {}
+		buf = b''
+		pos = 0
+		eof = False
+		while True:
+			# a varint length has at most 10 bytes
+			if len(buf) - pos < 10 and not eof:
+				chunk = _indexable(fh.read(cls.chunk_size))
+				eof = not chunk
+				buf = buf[pos:] + chunk
+				pos = 0
+			if pos >= len(buf):
+				break
+			length, start = _read_varint(buf, pos)
+			if length == 0:
+				break
+			if start + length > len(buf):
+				# the buffer at most doubles, so a garbage length does not
+				# result in a huge read
+				missing = min(start + length - len(buf), len(buf))
+				chunk = _indexable(fh.read(max(cls.chunk_size, missing)))
+				if not chunk:
+					raise ValueError('Truncated record')
+				buf = buf[pos:] + chunk
+				pos = 0
+				continue
+			if len(cache) > 2 ** 16:
+				cache.clear()
+			yield cls.decode(buf, start, keys, cache=cache)
+			pos = start + length
+
+	@classmethod
+	def dump(cls, data, fh, index=True):
+		keys = dict()
+		offsets = []
+		fh.write(cls.magic)
+		pos = len(cls.magic)
+		for entry in data:
+			record = cls.encode(entry, keys)
+			fh.write(record)
+			offsets.append(pos)
+			pos += len(record)
+		fh.write(_VARINT[0])
+		pos += 1
+
+		if index:
+			table_offset = pos
+			parts = [_varint(len(keys))]
+			for key in sorted(keys, key=keys.get):
+				b = key.encode('utf8')
+				parts += [_varint(len(b)), b]
+			table = b''.join(parts)
+			fh.write(table)
+			index_offset = pos + len(table)
+			fh.write(struct.pack(str('<%iQ' % len(offsets)), *offsets))
+			fh.write(cls.trailer.pack(
+				table_offset, index_offset, len(offsets), b'CCRI'))
+
+
+class RecordReader(object):
+	"""Random access to a :py:class:`Records` file that has an index.
+
+	`buf` is a bytes object or a memory map.  Records are decoded on access.
+	"""
+
+	def __init__(self, buf):
+		buf = self.buffer = _indexable(buf)
+		size = Records.trailer.size
+		if len(buf) < size or buf[:len(Records.magic)] != Records.magic:
+			raise ValueError('Not a record file')
+		table_offset, self.index_offset, self.count, tag = \
+			Records.trailer.unpack(buf[len(buf) - size:])
+		if tag != b'CCRI':
+			raise ValueError('Record file has no index')
+		if not (len(Records.magic) <= table_offset <= self.index_offset and
+				self.index_offset + 8 * self.count <= len(buf) - size):
+			raise ValueError('Invalid record index')
+
+		self.cache = {}
+		n, pos = _read_varint(buf, table_offset)
+		self.keys = []
+		for i in range(n):
+			length, pos = _read_varint(buf, pos)
+			self.keys.append(buf[pos:pos + length].decode('utf8'))
+			pos += length
+
+	@classmethod
+	def open(cls, filename):
+		return cls(MappedFile.open(filename).buffer)
+
+	def __len__(self):
+		return self.count
+
+	def offset(self, i):
+		"""Byte offset of record `i`."""
+		if i < 0:
+			i += self.count
+		if not 0 <= i < self.count:
+			raise IndexError(i)
+		return struct.unpack_from(
+			str('<Q'), self.buffer, self.index_offset + 8 * i)[0]
+
+	def __getitem__(self, i):
+		offset = self.offset(i)
+		if offset >= self.index_offset:
+			raise ValueError('Invalid record index')
+		length, pos = _read_varint(self.buffer, offset)
+		if len(self.cache) > 2 ** 16:
+			self.cache.clear()
+		return Records.decode(
+			self.buffer, pos, self.keys, define=False, cache=self.cache)
+
+	def __iter__(self):
+		for i in range(self.count):
+			yield self[i]
+
+	def close(self):
+		if hasattr(self.buffer, 'close'):
+			self.buffer.close()
+
+
+def _merge_keys(value):
+	keys = value.split(',')
+	for key in keys:
+		try:
+			parse_merge_key(key)
+		except ValueError as err:
+			raise argparse.ArgumentTypeError(_str(err))
+	return keys
+
+
+def _format_name(method):
+	def check(value):
+		if get_format(value, method) is None:
+			raise argparse.ArgumentTypeError('unknown format: %s' % value)
+		return value
+	return check
 
 
 def parse_args(argv=None):
-	informats, outformats = formats()
+	builtin = ', '.join(sorted(_builtin_formats()))
 
 	parser = argparse.ArgumentParser(description=__doc__,
 		formatter_class=argparse.RawTextHelpFormatter)
 	parser.add_argument('--version', '-V', action='version', version=__version__)
-	parser.add_argument('--from', '-f', choices=list(informats.keys()),
-		metavar='FORMAT', dest='informat')
-	parser.add_argument('--to', '-t', choices=list(outformats.keys()),
-		metavar='FORMAT', dest='outformat')
+	parser.add_argument('--from', '-f', type=_format_name('load'),
+		metavar='FORMAT', dest='informat',
+		help='one of %s or a plugin format' % builtin)
+	parser.add_argument('--to', '-t', type=_format_name('dump'),
+		metavar='FORMAT', dest='outformat',
+		help='one of %s or a plugin format' % builtin)
 	parser.add_argument('input', nargs='*', default=['-'], metavar='FILE')
 	parser.add_argument('--output', '-o', metavar='FILENAME')
+	parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+		help='parse input files in N processes (default: %(default)s)')
+	parser.add_argument('--cache-dir', metavar='DIR',
+		help='cache parsed input files in this directory')
+	parser.add_argument('--cache-size', type=int, default=512, metavar='MIB',
+		help='maximum size of the cache (default: %(default)s)')
 	parser.add_argument('--sort', '-s', metavar='SORTKEY',
 		help='sort entries by this field')
-	parser.add_argument('--merge', '-m', metavar='MERGEKEY',
-		help='merge entries by this field')
+	parser.add_argument('--sort-missing', choices=['first', 'last'],
+		default='first', help='where to put entries without SORTKEY')
+	parser.add_argument('--sort-buffer', type=int, default=100000,
+		metavar='N', help='sort at most N entries in memory and spill '
+		'the rest to temporary files (default: %(default)s)')
+	parser.add_argument('--merge', '-m', metavar='MERGEKEY', action='append',
+		type=_merge_keys, help='merge entries by these comma separated '
+		'fields, each optionally followed by ":casefold", ":digits" or ":space"')
+	parser.add_argument('--state', metavar='FILENAME',
+		help='keep state in this file and only process what changed '
+		'since the last run (requires --output)')
+	parser.add_argument('--state-key', metavar='KEY', action='append',
+		type=_merge_keys, help='with --state, report entries that share '
+		'these comma separated fields with a previous one as changed '
+		'(default: MERGEKEY)')
+
+	group = parser.add_argument_group('ldif output')
+	group.add_argument('--ldif-dn', default='cn={name}', metavar='TEMPLATE',
+		help='DN of each entry, e.g. "cn={name},ou=people,dc=example,dc=com" '
+		'(default: %(default)s)')
+	group.add_argument('--ldif-changetype', choices=LDIF.changetypes,
+		help='write change records instead of content records')
 	return parser.parse_args(argv)
 
 
-def get_outformat(args):
-	informats, outformats = formats()
+def _dump_kwargs(args, cls):
+	"""Command line options that are passed to ``cls.dump()``."""
+	if issubclass(cls, LDIF):
+		return {'dn': args.ldif_dn, 'changetype': args.ldif_changetype}
+	return {}
+
 
+def get_outformat(args):
 	if args.outformat is not None:
 		return args.outformat
 	elif args.output is not None:
 		ext = args.output.split(os.path.extsep)[-1]
-		if ext in outformats:
+		if get_format(ext, 'dump') is not None:
 			return ext
 
 	print('Missing output format')
@@ -484,51 +2437,587 @@ def get_outformat(args):
 
 
 def get_informat(filename):
-	informats, outformats = formats()
-
 	parts = filename.split(':', -1)
-	if len(parts) == 2 and parts[1] in informats:
+	if len(parts) == 2 and get_format(parts[1], 'load') is not None:
 		return parts[1], parts[0]
 
 	ext = filename.split(os.path.extsep)[-1]
-	if ext in informats:
+	if get_format(ext, 'load') is not None:
 		return ext, filename
 
 	print('Missing input format')
 	sys.exit(1)
 
 
-def main():  # pragma: nocover
-	informats, outformats = formats()
-	args = parse_args()
+def _open_input(filename):
+	"""Open an input file, using a memory map for local regular files."""
+	if filename == '-':
+		return getattr(sys.stdin, 'buffer', sys.stdin)
+	try:
+		if os.path.isfile(filename) and os.path.getsize(filename) > 0:
+			return MappedFile.open(filename)
+	except (EnvironmentError, ValueError):  # pragma: nocover
+		pass
+	return open(filename, 'rb')
+
+
+class ParseCache(object):
+	"""On-disk cache of parsed entries.
+
+	Entries are stored per input file, keyed by its absolute path, size and
+	modification time, the input format and its
+	:py:meth:`Format.cache_key` as well as the cctool version.
+	Once the cache grows beyond `max_size` bytes, the least recently used
+	files are removed.
+	"""
+
+	def __init__(self, path, max_size=2 ** 29):
+		self.path = path
+		self.max_size = max_size
+
+	def _filename(self, informat, filename):
+		stat = os.stat(filename)
+		mtime = getattr(stat, 'st_mtime_ns', stat.st_mtime)
+		cls = get_format(informat)
+		extra = None if cls is None else cls.cache_key(filename)
+		key = repr((os.path.abspath(filename), stat.st_size, mtime,
+			informat, extra, __version__))
+		digest = hashlib.sha1(key.encode('utf8')).hexdigest()
+		return os.path.join(self.path, digest + '.cache')
+
+	def __contains__(self, key):
+		return os.path.exists(self._filename(*key))
+
+	def load(self, informat, filename, load):
+		"""Yield the entries of a file from cache or from ``load()``.
+
+		Entries that come from ``load()`` are written to the cache on the fly.
+		"""
+		path = self._filename(informat, filename)
+		try:
+			fh = open(path, 'rb')
+		except EnvironmentError:
+			pass
+		else:
+			with fh:
+				os.utime(path, None)
+				for item in _read_pickles(fh):
+					yield item
+			return
+
+		try:
+			os.makedirs(self.path)
+		except OSError:
+			# other workers or processes may create it at the same time
+			if not os.path.isdir(self.path):
+				raise
+		fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+		try:
+			with os.fdopen(fd, 'wb') as fh:
+				for item in load():
+					_write_pickles(fh, [item])
+					yield item
+			getattr(os, 'replace', os.rename)(tmp, path)
+		finally:
+			if os.path.exists(tmp):
+				os.remove(tmp)
+		self.evict()
+
+	def evict(self):
+		"""Remove least recently used files until the cache is small enough."""
+		files = []
+		for name in os.listdir(self.path):
+			if name.endswith('.cache'):
+				path = os.path.join(self.path, name)
+				try:
+					stat = os.stat(path)
+				except EnvironmentError:  # pragma: nocover
+					continue
+				files.append((stat.st_mtime, stat.st_size, path))
+
+		total = sum(size for mtime, size, path in files)
+		for mtime, size, path in sorted(files):
+			if total <= self.max_size:
+				break
+			try:
+				os.remove(path)
+			except EnvironmentError:  # pragma: nocover
+				pass
+			total -= size
+
+
+def _load_input(informat, filename, cache=None):
+	if cache is not None and filename != '-':
+		load = lambda: _load_input(informat, filename)
+		for item in cache.load(informat, filename, load):
+			yield item
+		return
+
+	infile = _open_input(filename)
+	try:
+		for item in get_format(informat)().load(infile):
+			yield item
+	finally:
+		if filename != '-':
+			infile.close()
+
+
+def _serialize(data):
+	return pickle.dumps(list(data), pickle.HIGHEST_PROTOCOL)
+
+
+def _deserialize(s):
+	return pickle.loads(s)
 
-	outformat = get_outformat(args)
 
-	data = []
+def _load_task(task, cache=None):
+	"""Parse a file, a part of a file or a string of bytes in a worker process.
+
+	`data` is either None for the whole file, a ``(start, end, preamble)``
+	tuple of offsets in the file and :py:meth:`Format.preamble`, or the
+	bytes to parse.  The entries are returned in serialized form.
+	"""
+	informat, filename, data = task
+	if isinstance(data, tuple):
+		start, end, preamble = data
+		fh = MappedFile.open(filename, start, end)
+		try:
+			if preamble:
+				return _serialize(get_format(informat)().loads(
+					preamble + fh.read()))
+			return _serialize(get_format(informat)().load(fh))
+		finally:
+			fh.close()
+	elif data is not None:
+		return _serialize(get_format(informat)().loads(data))
+	else:
+		if informat is None:
+			informat, filename = get_informat(filename)
+		return _serialize(_load_input(informat, filename, cache))
+
+
+def _imap(pool, func, iterable, window):
+	"""Like :py:meth:`multiprocessing.Pool.imap` with bounded prefetching.
+
+	`Pool.imap` consumes `iterable` as fast as it can, while this keeps at
+	most `window` tasks in flight.  Results are yielded in order.
+	"""
+	pending = deque()
+	for arg in iterable:
+		pending.append(pool.apply_async(func, (arg,)))
+		if len(pending) >= window:
+			yield pending.popleft().get()
+	while pending:
+		yield pending.popleft().get()
+
+
+def _iter_parallel(args, cache=None):
+	tasks = []
 	for filename in args.input:
+		# resolve formats early to fail before starting any worker
 		if args.informat is not None:
-			informat = args.informat
+			informat, _filename = args.informat, filename
 		else:
-			informat, filename = get_informat(filename)
+			informat, _filename = get_informat(filename)
+
+		if _filename == '-':
+			stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+			tasks.append((informat, None, stdin.read()))
+		else:
+			tasks.append((args.informat, filename, None))
+
+	# imported here because it is slow to import and rarely needed
+	import multiprocessing
+	pool = multiprocessing.Pool(args.jobs)
+	try:
+		func = functools.partial(_load_task, cache=cache)
+		for result in _imap(pool, func, tasks, 2 * args.jobs):
+			for item in _deserialize(result):
+				yield item
+	finally:
+		pool.terminate()
+
+
+def _chunk_tasks(cls, informat, fh):
+	preamble = b''
+	for chunk in cls.split(fh):
+		yield informat, None, preamble + chunk
+		preamble += cls.preamble(chunk)
+
 
-		infile = sys.stdin if filename == '-' else open(filename, 'rb')
-		data += informats[informat]().load(infile)
+def _iter_chunks(informat, filename, jobs):
+	cls = get_format(informat)
+
+	infile = _open_input(filename)
+	# imported here because it is slow to import and rarely needed
+	import multiprocessing
+	pool = multiprocessing.Pool(jobs)
+	try:
+		if isinstance(infile, MappedFile):
+			# workers map the file themselves, so only offsets are sent
+			preamble = cls.preamble(infile.buffer)
+			tasks = ((informat, filename, (start, end, preamble))
+				for start, end in cls.split_offsets(infile.buffer))
+		else:
+			tasks = _chunk_tasks(cls, informat, infile)
+		for result in _imap(pool, _load_task, tasks, 2 * jobs):
+			for item in _deserialize(result):
+				yield item
+	finally:
+		pool.terminate()
 		if filename != '-':
 			infile.close()
 
-	if outformat in PERSON:
-		data = list(event2person(data))
-	if outformat in EVENT:
-		data = list(event2person(data, reverse=True))
 
+def iter_input(args):
+	"""Lazily read all entries from the input files in `args`.
+
+	Files are opened one after the other and closed as soon as they are
+	exhausted.  With ``--jobs``, several files are parsed in parallel and
+	the entries are returned in the original order.  A single file is split
+	into chunks that are parsed in parallel if its format supports that.
+	With ``--cache-dir``, parsed entries of unchanged files are reused.
+	"""
+	cache = None
+	if args.cache_dir is not None:
+		cache = ParseCache(args.cache_dir, args.cache_size * 2 ** 20)
+
+	if args.jobs > 1 and len(args.input) > 1:
+		for item in _iter_parallel(args, cache):
+			yield item
+		return
+
+	if args.jobs > 1 and len(args.input) == 1:
+		if args.informat is not None:
+			informat, filename = args.informat, args.input[0]
+		else:
+			informat, filename = get_informat(args.input[0])
+		# formats with a boundary can be split for parallel parsing
+		if get_format(informat).boundary is not None:
+			load = lambda: _iter_chunks(informat, filename, args.jobs)
+			if cache is None or filename == '-':
+				items = load()
+			else:
+				items = cache.load(informat, filename, load)
+			for item in items:
+				yield item
+			return
+
+	for filename in args.input:
+		if args.informat is not None:
+			informat = args.informat
+		else:
+			informat, filename = get_informat(filename)
+
+		for item in _load_input(informat, filename, cache):
+			yield item
+
+
+def _reads_at_once(args):
+	"""Check whether all input is in memory before the first entry is read.
+
+	That is the case for a single input file in a format without
+	:py:attr:`Format.streaming_load`.
+	"""
+	if len(args.input) != 1:
+		return False
+	if args.informat is not None:
+		informat = args.informat
+	else:
+		informat, filename = get_informat(args.input[0])
+	return not get_format(informat).streaming_load
+
+
+def write_synced(fmt, groups, filename, previous=None, **kwargs):
+	"""Write the entries of :py:func:`sync` groups to `filename`.
+
+	`previous` is the return value of the last call for the same file.  If
+	the file has not been touched since, it is left alone when no entry
+	changed.  For :py:attr:`Format.appendable` formats, the file is
+	truncated after the last unchanged entry and only the rest is written.
+	`kwargs` are passed to ``fmt.dump()``.
+	"""
+	fps = [group['fp'] for group in groups]
+	start = 0
+	offsets = []
+	if (previous is not None and os.path.isfile(filename) and
+			os.path.getsize(filename) == previous['size']):
+		if previous['fps'] == fps:
+			return previous
+		if previous['offsets'] is not None:
+			for a, b in zip(fps, previous['fps']):
+				if a != b:
+					break
+				start += 1
+			offsets = previous['offsets'][:start]
+
+	if not fmt.appendable:
+		with open(filename, 'wb') as fh:
+			fmt.dump((group['entry'] for group in groups), fh, **kwargs)
+			return {'fps': fps, 'offsets': None, 'size': fh.tell()}
+
+	with open(filename, 'r+b' if start else 'wb') as fh:
+		fh.seek(offsets[-1] if offsets else 0)
+		fh.truncate()
+		for group in groups[start:]:
+			fmt.dump([group['entry']], fh, **kwargs)
+			offsets.append(fh.tell())
+		return {'fps': fps, 'offsets': offsets, 'size': fh.tell()}
+
+
+def sync_output(data, args, outformat):
+	"""Update ``--output`` from `data` using the state in ``--state``.
+
+	The state is discarded if any option that affects the output changed.
+	Returns the number of added, changed and removed entries.
+	"""
+	cls = get_format(outformat)
+	kwargs = _dump_kwargs(args, cls)
+	config = (__version__, outformat, args.merge, args.sort, args.sort_missing,
+		sorted(kwargs.items()))
+
+	state = None
+	if os.path.exists(args.state):
+		with open(args.state, 'rb') as fh:
+			state = pickle.load(fh)
+	if state is None or state['config'] != config:
+		state = {'config': config, 'groups': None, 'output': None}
+
+	key = None
 	if args.merge is not None:
-		data = merged(data, key=args.merge)
+		key = sum(args.merge, [])
+	sortkey = None
+	if args.sort is not None:
+		sortkey = sort_key(args.sort, missing=args.sort_missing)
+
+	identity = None
+	if args.state_key is not None:
+		identity = sum(args.state_key, [])
+
+	groups, delta = sync(data, state['groups'], key=key, sortkey=sortkey,
+		identity=identity)
+	output = write_synced(cls, groups, args.output, state['output'], **kwargs)
+
+	state = {'config': config, 'groups': groups, 'output': output}
+	fd, tmp = tempfile.mkstemp(
+		dir=os.path.dirname(os.path.abspath(args.state)), suffix='.tmp')
+	try:
+		with os.fdopen(fd, 'wb') as fh:
+			pickle.dump(state, fh, pickle.HIGHEST_PROTOCOL)
+		getattr(os, 'replace', os.rename)(tmp, args.state)
+	finally:
+		if os.path.exists(tmp):
+			os.remove(tmp)
+	return delta
+
+
+def _index_value(value, normalize=None):
+	if isinstance(value, date):
+		value = _format_date(value)
+	else:
+		value = _str(value)
+	if normalize is not None:
+		value = normalize(value)
+	return value
+
+
+def build_index(cls, buf, keys):
+	"""Map values of `keys` to the byte ranges of the records in `buf`.
+
+	`keys` are field names, optionally followed by a normalizer like in
+	:py:func:`merged`.  Dates are indexed as ``YYYY-MM-DD``.  `cls` must
+	have a :py:attr:`Format.boundary` so that records can be found without
+	parsing the whole buffer.
+	"""
+	parsed = [(key,) + parse_merge_key(key) for key in keys]
+	index = dict((key, {}) for key in keys)
+	preamble = cls.preamble(buf)
+	for start, end in cls.split_offsets(buf, size=1):
+		for entry in cls.loads(preamble + buf[start:end]):
+			for key, field, normalize in parsed:
+				for value in entry[field]:
+					ranges = index[key].setdefault(
+						_index_value(value, normalize), [])
+					if not ranges or ranges[-1] != [start, end]:
+						ranges.append([start, end])
+	return index
+
+
+def query_index(cls, buf, index, conditions):
+	"""Yield the entries in `buf` that match all `conditions`.
+
+	`conditions` is a list of ``(key, value)`` pairs where `key` is one of
+	the keys in `index`.  Only the matching records are parsed.
+	"""
+	ranges = None
+	matches = []
+	for key, value in conditions:
+		if key not in index:
+			raise KeyError(key)
+		field, normalize = parse_merge_key(key)
+		value = _index_value(value, normalize)
+		_ranges = set(tuple(r) for r in index[key].get(value, []))
+		ranges = _ranges if ranges is None else ranges & _ranges
+		matches.append((field, normalize, value))
+
+	preamble = cls.preamble(buf) if ranges else b''
+	for start, end in sorted(ranges or []):
+		for entry in cls.loads(preamble + buf[start:end]):
+			# a record may contain more than one entry
+			if all(value in [_index_value(v, normalize) for v in entry[field]]
+					for field, normalize, value in matches):
+				yield entry
+
+
+def _index_args(argv, query=False):
+	parser = argparse.ArgumentParser(prog='cctool query' if query else
+		'cctool index', description='Find entries in a large file by '
+		'looking up field values in an index.' if query else 'Build an index '
+		'that maps field values to the positions of entries in a file.')
+	parser.add_argument('input', metavar='FILE')
+	parser.add_argument('--from', '-f', type=_format_name('load'),
+		metavar='FORMAT', dest='informat')
+	parser.add_argument('--index-file', metavar='FILENAME',
+		help='default: FILE.idx')
+	if query:
+		parser.add_argument('conditions', nargs='+', metavar='KEY=VALUE',
+			help='e.g. email:casefold=foo@example.com or dtstart=2015-01-31')
+		parser.add_argument('--to', '-t', type=_format_name('dump'),
+			metavar='FORMAT', dest='outformat')
+		parser.add_argument('--output', '-o', metavar='FILENAME')
+	else:
+		parser.add_argument('--key', '-k', metavar='KEY', action='append',
+			type=_merge_keys, help='comma separated fields to index, each '
+			'optionally followed by a normalizer (default: email,name,dtstart)')
+	args = parser.parse_args(argv)
+
+	if args.informat is None:
+		args.informat, args.input = get_informat(args.input)
+	if args.input == '-':
+		# the index refers to byte offsets in the file
+		parser.error('FILE must be a file, not stdin')
+	if args.index_file is None:
+		args.index_file = args.input + '.idx'
+	return args
+
+
+def _index_stat(filename):
+	stat = os.stat(filename)
+	return [stat.st_size, getattr(stat, 'st_mtime_ns', stat.st_mtime)]
+
+
+def index_main(argv):  # pragma: nocover
+	args = _index_args(argv)
+	cls = get_format(args.informat)
+	if cls.boundary is None:
+		print('Format can not be indexed: %s' % args.informat)
+		sys.exit(1)
+	keys = sum(args.key or [['email', 'name', 'dtstart']], [])
+
+	fh = _open_input(args.input)
+	try:
+		buf = fh.buffer if isinstance(fh, MappedFile) else fh.read()
+		index = build_index(cls, buf, keys)
+	finally:
+		fh.close()
+
+	with open(args.index_file, 'w') as fh:
+		json.dump({
+			'version': __version__,
+			'format': args.informat,
+			'stat': _index_stat(args.input),
+			'index': index,
+		}, fh)
+
+
+def query_main(argv):  # pragma: nocover
+	args = _index_args(argv, query=True)
+	cls = get_format(args.informat)
+	outformat = get_outformat(args)
+
+	try:
+		with open(args.index_file) as fh:
+			index = json.load(fh)
+	except EnvironmentError:
+		print('Missing index, run "cctool index %s" first' % args.input)
+		sys.exit(1)
+	if (index['stat'] != _index_stat(args.input) or
+			index['format'] != args.informat or
+			index['version'] != __version__):
+		print('Index is out of date, run "cctool index %s"' % args.input)
+		sys.exit(1)
+
+	conditions = []
+	for condition in args.conditions:
+		key, sep, value = condition.partition('=')
+		if not sep or key not in index['index']:
+			print('Unknown index key: %s' % key)
+			sys.exit(1)
+		conditions.append((key, value))
+
+	outcls = get_format(outformat)
+	fh = _open_input(args.input)
+	try:
+		buf = fh.buffer if isinstance(fh, MappedFile) else fh.read()
+		data = query_index(cls, buf, index['index'], conditions)
+		outcls().dump(_convert(data, outcls), _open_output(args.output))
+	finally:
+		fh.close()
+
+
+def _convert(data, cls):
+	"""Convert entries to the :py:attr:`Format.kind` of `cls`."""
+	if cls.kind == 'person':
+		return event2person(data)
+	elif cls.kind == 'event':
+		return event2person(data, reverse=True)
+	else:
+		return data
+
+
+def _open_output(filename):
+	if filename is None:
+		return getattr(sys.stdout, 'buffer', sys.stdout)
+	else:
+		return open(filename, 'wb')
+
+
+def main():  # pragma: nocover
+	if sys.argv[1:2] == ['index']:
+		return index_main(sys.argv[2:])
+	elif sys.argv[1:2] == ['query']:
+		return query_main(sys.argv[2:])
+
+	args = parse_args()
+
+	outformat = get_outformat(args)
+	cls = get_format(outformat)
+
+	# without --merge and --sort, entries are streamed from the readers
+	# to the writer one at a time
+	data = _convert(iter_input(args), cls)
+
+	if args.state is not None:
+		if args.output is None:
+			print('--state requires --output')
+			sys.exit(1)
+		delta = sync_output(data, args, outformat)
+		print('%i added, %i changed, %i removed' % delta, file=sys.stderr)
+		return
+
+	if args.merge is not None:
+		data = merged(data, key=sum(args.merge, []))
 
 	if args.sort is not None:
-		data = sorted(data, key=lambda x: x[args.sort])
+		key = sort_key(args.sort, missing=args.sort_missing)
+		if cls.streaming_dump and not _reads_at_once(args):
+			data = external_sorted(data, key, buffer_size=args.sort_buffer)
+		else:
+			# the reader or the writer holds all entries anyway, so
+			# spilling to disk would not save any memory
+			data = sorted(data, key=key)
 
-	outfile = sys.stdout if args.output is None else open(args.output, 'wb')
-	outformats[outformat]().dump(data, outfile)
+	cls().dump(data, _open_output(args.output), **_dump_kwargs(args, cls))
 
 
 if __name__ == '__main__':
@@ -1,8 +1,22 @@
 from __future__ import unicode_literals
 
 import unittest
+from datetime import date
 from datetime import datetime
+from datetime import timedelta
 from io import BytesIO
+from io import StringIO
+try:
+	from StringIO import StringIO as NativeStringIO
+except ImportError:
+	NativeStringIO = StringIO
+import copy
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
 
 import cctool
 
@@ -74,6 +88,53 @@ class TestMultiDict(unittest.TestCase):
 		self.assertEqual(self.d['bar'], [1, 2])
 		self.assertEqual(self.d['baz'], [1, 2, 4])
 
+	def test_append_many(self):
+		self.d.append('foo', list(range(100)) + list(range(50, 150)))
+		self.d.append('foo', [[1], [1], 3])
+		self.assertEqual(self.d['foo'], list(range(150)) + [[1]])
+
+	def test_append_copies(self):
+		values = [1, 2]
+		self.d['foo'] = values
+		self.d.append('foo', [3])
+		self.assertEqual(self.d['foo'], [1, 2, 3])
+		self.assertEqual(values, [1, 2])
+
+	def test_append_empty(self):
+		self.d.append('foo', [])
+		self.assertEqual(list(self.d.keys()), [])
+
+	def test_append_iterable(self):
+		self.d.append('foo', (i % 10 for i in range(20)))
+		self.assertEqual(self.d['foo'], list(range(10)))
+
+	def test_copy(self):
+		self.d.append('foo', list(range(20)))
+		for d in [self.d.copy(), copy.copy(self.d)]:
+			self.assertIsInstance(d, cctool.MultiDict)
+			self.d.append('foo', [len(self.d['foo'])])
+			self.assertEqual(d['foo'], list(range(20)))
+			d.append('foo', [100])
+			self.assertEqual(d['foo'], list(range(20)) + [100])
+		self.assertEqual(self.d['foo'], list(range(22)))
+
+	def test_pickle(self):
+		self.d.append('foo', list(range(20)))
+		d = pickle.loads(pickle.dumps(self.d, 2))
+		d.append('foo', [1, 20])
+		self.assertEqual(d['foo'], list(range(21)))
+
+	def test_pickle_state(self):
+		self.d.append('foo', list(range(20)))
+		small = cctool.MultiDict([('foo', list(range(20)))])
+		self.assertEqual(pickle.dumps(self.d, 2), pickle.dumps(small, 2))
+
+	def test_append_small(self):
+		self.d.append('foo', [1])
+		self.d.append('foo', [2, 1])
+		self.assertEqual(self.d['foo'], [1, 2])
+		self.assertFalse(hasattr(self.d, '_owned'))
+
 
 class TestMerged(unittest.TestCase):
 	def test_merged(self):
@@ -94,6 +155,162 @@ class TestMerged(unittest.TestCase):
 		for item in actual:
 			self.assertIn(item, expected)
 
+	def test_merged_transitive(self):
+		data = [
+			cctool.MultiDict({'foo': [1], 'bar': [1]}),
+			cctool.MultiDict({'foo': [2], 'bar': [2]}),
+			cctool.MultiDict({'foo': [1, 2], 'bar': [3]}),
+		]
+		for _data in [data, data[::-1]]:
+			actual = cctool.merged([cctool.MultiDict(d) for d in _data], key='foo')
+			self.assertEqual(len(actual), 1)
+			self.assertEqual(set(actual[0]['foo']), set([1, 2]))
+			self.assertEqual(set(actual[0]['bar']), set([1, 2, 3]))
+
+
+	def test_merged_multiple_keys(self):
+		data = [
+			cctool.MultiDict({'email': ['Foo@example.com'], 'phone': ['1']}),
+			cctool.MultiDict({'email': ['foo@example.com']}),
+			cctool.MultiDict({'phone': ['+1 2'], 'name': ['bar']}),
+			cctool.MultiDict({'phone': ['(12)'], 'name': ['baz']}),
+		]
+		actual = cctool.merged(data, key=['email:casefold', 'phone:digits'])
+		self.assertEqual(len(actual), 2)
+		self.assertEqual(actual[0]['email'], ['Foo@example.com', 'foo@example.com'])
+		self.assertEqual(actual[1]['name'], ['bar', 'baz'])
+
+	def test_merged_unknown_normalizer(self):
+		with self.assertRaises(ValueError):
+			cctool.merged([], key='email:foo')
+
+
+class TestSort(unittest.TestCase):
+	def test_sort_key(self):
+		data = [
+			cctool.MultiDict({'foo': ['b']}),
+			cctool.MultiDict({'foo': [dt]}),
+			cctool.MultiDict({'bar': ['x']}),
+			cctool.MultiDict({'foo': [datetime(1970, 1, 1).date()]}),
+			cctool.MultiDict({'foo': [2]}),
+			cctool.MultiDict({'foo': ['a', 'b']}),
+		]
+		actual = sorted(data, key=cctool.sort_key('foo'))
+		self.assertEqual(actual, [data[i] for i in [2, 4, 3, 1, 5, 0]])
+		actual = sorted(data, key=cctool.sort_key('foo', missing='last'))
+		self.assertEqual(actual, [data[i] for i in [4, 3, 1, 5, 0, 2]])
+
+	def test_external_sorted(self):
+		data = [cctool.MultiDict({'foo': [i % 7], 'bar': [i]}) for i in range(50)]
+		key = cctool.sort_key('foo')
+		actual = list(cctool.external_sorted(iter(data), key, buffer_size=8))
+		self.assertEqual(actual, sorted(data, key=key))
+
+
+class TestSync(unittest.TestCase):
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
+
+	def data(self, rows):
+		return [cctool.MultiDict({'email': [e], 'name': [n]}) for e, n in rows]
+
+	def expected(self, rows, key):
+		data = cctool.merged(self.data(rows), 'email:casefold')
+		return sorted(data, key=key)
+
+	def test_sync(self):
+		key = cctool.sort_key('name')
+		rows = [('a@x', 'A'), ('b@x', 'B'), ('c@x', 'C'), ('A@x', 'D')]
+		groups, delta = cctool.sync(self.data(rows), key='email:casefold', sortkey=key)
+		self.assertEqual([g['entry'] for g in groups], self.expected(rows, key))
+		self.assertEqual(delta, (3, 0, 0))
+
+		rows = [('a@x', 'A'), ('b@x', 'B'), ('c@x', 'C'), ('A@x', 'D')]
+		groups, delta = cctool.sync(self.data(rows), groups, 'email:casefold', key)
+		self.assertEqual(delta, (0, 0, 0))
+
+		# b@x was edited, so it is matched by its merge key
+		rows = [('c@x', 'C'), ('b@x', 'E'), ('a@x', 'A'), ('B@x', 'B')]
+		groups, delta = cctool.sync(self.data(rows), groups, 'email:casefold', key)
+		self.assertEqual([g['entry'] for g in groups], self.expected(rows, key))
+		self.assertEqual(delta, (0, 2, 0))
+
+		rows = [('c@x', 'C'), ('d@x', 'F')]
+		groups, delta = cctool.sync(self.data(rows), groups, 'email:casefold', key)
+		self.assertEqual([g['entry'] for g in groups], self.expected(rows, key))
+		self.assertEqual(delta, (1, 0, 2))
+
+	def test_sync_identity(self):
+		rows = [('a@x', 'A'), ('b@x', 'B'), ('c@x', 'C')]
+		groups, delta = cctool.sync(self.data(rows))
+		rows = [('a@x', 'A'), ('b@x', 'E'), ('d@x', 'D')]
+		# without a key, entries are only identified by their content
+		delta = cctool.sync(self.data(rows), groups)[1]
+		self.assertEqual(delta, (2, 0, 2))
+		delta = cctool.sync(self.data(rows), groups, identity='email')[1]
+		self.assertEqual(delta, (1, 1, 1))
+
+	def test_write_synced(self):
+		filename = os.path.join(self.tmpdir, 'out.jsonl')
+		rows = [('a@x', 'A'), ('b@x', 'B'), ('c@x', 'C')]
+		groups, delta = cctool.sync(self.data(rows))
+		output = cctool.write_synced(cctool.JSONLines, groups, filename)
+
+		rows = [('a@x', 'A'), ('b@x', 'B'), ('d@x', 'D')]
+		groups, delta = cctool.sync(self.data(rows), groups)
+		output = cctool.write_synced(cctool.JSONLines, groups, filename, output)
+		self.assertEqual(output['offsets'][:2], [31, 62])
+		with open(filename, 'rb') as fh:
+			self.assertEqual(fh.read(), cctool.JSONLines.dumps(self.data(rows)))
+
+		# unchanged output is not written again
+		os.utime(filename, (0, 0))
+		cctool.write_synced(cctool.JSONLines, groups, filename, output)
+		self.assertEqual(os.path.getmtime(filename), 0)
+
+
+class TestIndex(unittest.TestCase):
+	text = (b'[format]\nprogram=abook\n\n'
+		b'[0]\nname=Foo\nemail=foo@example.com,f@x.org\nbday=1990-01-02\n\n'
+		b'[1]\nname=Bar\nemail=bar@example.com\n\n'
+		b'[2]\nname=Baz\nemail=F@X.org\n')
+
+	def test_build_index(self):
+		index = cctool.build_index(
+			cctool.ABook, self.text, ['email:casefold', 'bday'])
+		self.assertEqual(index, {
+			'email:casefold': {
+				'foo@example.com': [[24, 84]],
+				'f@x.org': [[24, 84], [120, 147]],
+				'bar@example.com': [[84, 120]],
+			},
+			'bday': {'1990-01-02': [[24, 84]]},
+		})
+
+	def test_query_index(self):
+		index = cctool.build_index(
+			cctool.ABook, self.text, ['email:casefold', 'name'])
+
+		def query(*conditions):
+			items = cctool.query_index(cctool.ABook, self.text, index, conditions)
+			return [item.first('name') for item in items]
+
+		self.assertEqual(query(('email:casefold', 'F@x.org')), ['Foo', 'Baz'])
+		self.assertEqual(query(('email:casefold', 'f@x.org'), ('name', 'Baz')), ['Baz'])
+		self.assertEqual(query(('name', 'Qux')), [])
+		with self.assertRaises(KeyError):
+			query(('email', 'f@x.org'))
+
+	def test_args(self):
+		args = cctool._index_args(['-f', 'abook', 'foo'])
+		self.assertEqual(args.index_file, 'foo.idx')
+		for argv in [['-f', 'abook', '-'], ['-:abook']]:
+			with self.assertRaises(SystemExit):
+				cctool._index_args(argv)
+
 
 class TestMapKeys(unittest.TestCase):
 	def test_simple(self):
@@ -267,6 +484,14 @@ class _TestFormat(unittest.TestCase):
 	def test_dump(self):
 		self.assertEqual(self.format.dumps(self.data), self.text)
 
+	def assertSplit(self, text):
+		expected = list(self.format.loads(text))
+		chunks = list(self.format.split(BytesIO(text), size=1))
+		self.assertEqual(b''.join(chunks), text)
+		self.assertGreaterEqual(len(chunks), len(expected))
+		actual = sum((list(self.format.loads(c)) for c in chunks), [])
+		self.assertEqual(actual, expected)
+
 
 class TestBSDCal(_TestFormat):
 	def setUp(self):
@@ -284,8 +509,46 @@ class TestBSDCal(_TestFormat):
 		]
 		self.text = b'01/01\tfoo\n01/01*\tbar\n'
 
+	def test_split(self):
+		self.assertSplit(b'01/01\tfoo\n\tcontinued\n02/03*\tbar\n')
+
+	def test_load_syntax(self):
+		text = (b'# comment\n'
+			b'Jan 02\tfoo\n'
+			b'\tcontinued\n'
+			b'3 February*\tbar  \n'
+			b'02/30\tinvalid\n'
+			b'\tnot continued\n'
+			b'Foo 01\tinvalid\n')
+		self.format.chunk_size = 16
+		actual = list(self.format.loads(text))
+		self.assertEqual(actual, [
+			cctool.MultiDict([
+				('dtstart', [datetime(year, 1, 2)]),
+				('summary', ['foo\ncontinued']),
+			]),
+			cctool.MultiDict([
+				('dtstart', [datetime(year, 2, 3)]),
+				('summary', ['bar']),
+				('freq', ['yearly']),
+			]),
+		])
+		self.assertEqual(self.format.dumps(actual[:1]), b'01/02\tfoo\n\tcontinued\n')
+
+	def test_include(self):
+		tmpdir = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, tmpdir)
+		with open(os.path.join(tmpdir, 'a'), 'wb') as fh:
+			fh.write(b'01/01\tfoo\n#include "b"\n#include <missing>\n')
+		with open(os.path.join(tmpdir, 'b'), 'wb') as fh:
+			fh.write(b'01/02\tbar\n#include "a"\n')
+
+		with open(os.path.join(tmpdir, 'a'), 'rb') as fh:
+			actual = [item.first('summary') for item in self.format.load(fh)]
+		self.assertEqual(actual, ['foo', 'bar'])
 
-@unittest.skipIf(isinstance(cctool.icalendar, Exception), 'icalendar not available')
+
+@unittest.skipIf(not cctool.has_backend('icalendar'), 'icalendar not available')
 class TestICal(_TestFormat):
 	def setUp(self):
 		self.format = cctool.ICal()
@@ -303,6 +566,111 @@ class TestICal(_TestFormat):
 		self.text = ('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//XI//NONSGML CCTOOL//\r\nBEGIN:VEVENT\r\nSUMMARY:lorem ipsum\r\nDTSTART;VALUE=DATE-TIME:%i0101T000000\r\nRRULE:FREQ=DAILY\r\nEND:VEVENT\r\nBEGIN:VEVENT\r\nSUMMARY:lorem ipsum2\r\nSUMMARY:lorem ipsum3\r\nDTSTART;VALUE=DATE:%i0101\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n' % (year, year)).encode('utf8')
 
 
+	def test_split(self):
+		self.assertSplit(self.text)
+
+	def test_dump_stream(self):
+		icalendar = cctool.import_backend('icalendar')
+		calendar = icalendar.Calendar()
+		calendar.add('prodid', '-//XI//NONSGML CCTOOL//')
+		calendar.add('version', '2.0')
+		for item in self.data:
+			event = icalendar.Event()
+			event.add('SUMMARY', item.first('summary'))
+			event.add('DTSTART', item.first('dtstart'))
+			calendar.add_component(event)
+
+		data = [cctool.MultiDict([
+			('summary', item['summary'][:1]),
+			('dtstart', item['dtstart']),
+		]) for item in self.data]
+		self.assertEqual(self.format.dumps(iter(data)), calendar.to_ical())
+
+	def test_load_stream(self):
+		def lines():
+			yield b'BEGIN:VCALENDAR\r\n'
+			yield b'BEGIN:VEVENT\r\n'
+			yield b'SUMMARY:lorem \r\n'
+			yield b' ipsum\r\n'
+			yield b'DTSTART;VALUE=DATE:19700101\r\n'
+			yield b'END:VEVENT\r\n'
+			# one line of lookahead is needed for unfolding
+			yield b'BEGIN:VEVENT\r\n'
+			raise AssertionError('read too far')
+
+		item = next(self.format.load(lines()))
+		self.assertEqual(item['summary'], ['lorem ipsum'])
+		self.assertEqual(item['dtstart'], [datetime(1970, 1, 1).date()])
+
+	def _calendar(self, tzid):
+		# icalendar caches timezones by TZID, so every test needs its own
+		vtimezone = (
+			'BEGIN:VTIMEZONE\r\n'
+			'TZID:%s\r\n'
+			'BEGIN:STANDARD\r\n'
+			'DTSTART:19700101T000000\r\n'
+			'TZOFFSETFROM:+0500\r\n'
+			'TZOFFSETTO:+0500\r\n'
+			'END:STANDARD\r\n'
+			'END:VTIMEZONE\r\n' % tzid)
+		events = ''.join(
+			'BEGIN:VEVENT\r\n'
+			'SUMMARY:%i\r\n'
+			'DTSTART;TZID=%s:20200101T120000\r\n'
+			'END:VEVENT\r\n' % (i, tzid) for i in range(2))
+		return ('BEGIN:VCALENDAR\r\n' + vtimezone + events +
+			'END:VCALENDAR\r\n').encode('utf8')
+
+	def assertOffset(self, items):
+		self.assertEqual(len(items), 2)
+		for item in items:
+			self.assertEqual(
+				item.first('dtstart').utcoffset(), timedelta(hours=5))
+
+	def test_load_timezone(self):
+		self.assertOffset(list(self.format.loads(self._calendar('Zone A'))))
+
+	def test_load_timezone_unknown(self):
+		text = (
+			'BEGIN:VCALENDAR\r\n' + ''.join(
+				'BEGIN:VEVENT\r\n'
+				'SUMMARY:%i\r\n'
+				'DTSTART%s:20200101T120000\r\n'
+				'END:VEVENT\r\n' % (i, tzid) for i, tzid in enumerate(
+					[';TZID=Nowhere', '', ';TZID=Nowhere'])) +
+			'END:VCALENDAR\r\n').encode('utf8')
+		items = list(self.format.loads(text))
+		self.assertEqual([item['summary'] for item in items], [['0'], ['1'], ['2']])
+		for item in items:
+			self.assertEqual(item.first('dtstart'), datetime(2020, 1, 1, 12))
+
+	def test_localize(self):
+		icalendar = cctool.import_backend('icalendar')
+		event = icalendar.Event.from_ical(
+			b'BEGIN:VEVENT\r\n'
+			b'DTSTART;TZID=Zone B:20200101T120000\r\n'
+			b'END:VEVENT\r\n')
+		tz = cctool.timezone(timedelta(hours=5))
+		self.format._localize(event, {'Zone B': tz})
+		self.assertEqual(event['DTSTART'].dt, datetime(2020, 1, 1, 12, tzinfo=tz))
+
+	def test_load_timezone_chunks(self):
+		text = self._calendar('Zone C')
+		fd, filename = tempfile.mkstemp()
+		os.write(fd, text)
+		os.close(fd)
+		try:
+			preamble = self.format.preamble(text)
+			items = []
+			for start, end in self.format.split_offsets(text, size=1):
+				result = cctool._load_task(
+					('ics', filename, (start, end, preamble)))
+				items += cctool._deserialize(result)
+		finally:
+			os.remove(filename)
+		self.assertOffset(items)
+
+
 class TestABook(_TestFormat):
 	def setUp(self):
 		self.format = cctool.ABook()
@@ -312,8 +680,64 @@ class TestABook(_TestFormat):
 		])]
 		self.text = b'[0]\nname = foo\nbday = 1970-01-01\n\n'
 
+	def test_split(self):
+		self.assertSplit(b'[0]\nname=foo\n\n[1]\nname=bar\nnick=b\n  ar\n')
+
+	def test_load_syntax(self):
+		text = (b'# abook addressbook file\n\n'
+			b'[format]\nprogram=abook\nversion=0.6.1\n\n'
+			b'[0]\nName=foo\nemail: foo@example.com,bar@example.com\n'
+			b'; comment\nbday=--03-04\nnick = f\n  oo\nunknown=1\n')
+		self.assertEqual(list(self.format.loads(text)), [cctool.MultiDict([
+			('name', ['foo']),
+			('email', ['foo@example.com', 'bar@example.com']),
+			('bday', [datetime(1900, 3, 4)]),
+			('nick', ['f\noo']),
+		])])
+
+	def test_load_stream(self):
+		def lines():
+			yield b'[0]\n'
+			yield b'name=foo\n'
+			yield b'[1]\n'
+			raise AssertionError('read too far')
+
+		self.assertEqual(next(self.format.load(lines())), cctool.MultiDict([
+			('name', ['foo']),
+		]))
+
+	def test_dump_configparser(self):
+		try:
+			from configparser import RawConfigParser
+		except ImportError:  # pragma: nocover
+			from ConfigParser import RawConfigParser
+
+		data = [
+			cctool.MultiDict([('name', ['foo']), ('nick', ['f\noo'])]),
+			cctool.MultiDict([('email', ['a@example.com', 'b@example.com'])]),
+		]
+		cp = RawConfigParser()
+		for i, item in enumerate(data):
+			cp.add_section(str(i))
+			for key in item:
+				cp.set(str(i), key, item.join(key))
+		# ConfigParser writes native strings
+		fh = NativeStringIO()
+		cp.write(fh)
+		expected = fh.getvalue()
+		if not isinstance(expected, bytes):
+			expected = expected.encode('utf8')
+		self.assertEqual(self.format.dumps(data), expected)
+
+	def test_dump_bday_without_year(self):
+		data = [cctool.MultiDict([
+			('name', ['foo', 'bar']),
+			('email', []),
+			('bday', [datetime(1900, 3, 4)]),
+		])]
+		self.assertEqual(self.format.dumps(data), b'[0]\nname = foo,bar\nbday = --03-04\n\n')
+
 
-@unittest.skipIf(isinstance(cctool.ldif3, Exception), 'ldif3 not available')
 class TestLDIF(_TestFormat):
 	def setUp(self):
 		self.format = cctool.LDIF()
@@ -324,7 +748,296 @@ class TestLDIF(_TestFormat):
 		self.text = b'cn: foo\nmail:: Zm9vQGV4YW1wbGUuY29t'
 
 	def test_dump(self):
-		pass
+		data = [
+			cctool.MultiDict([
+				('name', ['Foo Bar, Jr.']),
+				('email', ['foo@example.com']),
+				('city', [u'K\xf6ln']),
+				('address_lines', [' leading space']),
+			]),
+			cctool.MultiDict([('email', ['no-name@example.com'])]),
+			cctool.MultiDict([('name', [' ']), ('email', ['empty@example.com'])]),
+			cctool.MultiDict([('name', ['baz']), ('org', ['x' * 80])]),
+		]
+		text = self.format.dumps(data, dn='cn={name},dc=example')
+		self.assertEqual(text, (
+			b'version: 1\n'
+			b'\n'
+			b'dn: cn=Foo Bar\\, Jr.,dc=example\n'
+			b'objectClass: inetOrgPerson\n'
+			b'sn: Foo Bar, Jr.\n'
+			b'cn: Foo Bar, Jr.\n'
+			b'mail: foo@example.com\n'
+			b'l:: S8O2bG4=\n'
+			b'street:: IGxlYWRpbmcgc3BhY2U=\n'
+			b'\n'
+			b'dn: cn=baz,dc=example\n'
+			b'objectClass: inetOrgPerson\n'
+			b'sn: baz\n'
+			b'cn: baz\n'
+			b'o: ' + b'x' * 73 + b'\n'
+			b' xxxxxxx\n'))
+		self.assertEqual(list(self.format.loads(text)), [data[0], data[3]])
+
+	def test_dump_dn_date(self):
+		data = [cctool.MultiDict([('bday', [dt])])]
+		text = self.format.dumps(data, dn='uid={bday}')
+		self.assertIn(b'\ndn: uid=%i-01-01\n' % year, text)
+		self.assertNotIn(b'sn:', text)
+
+	def test_dump_changetype(self):
+		data = [cctool.MultiDict([('name', ['foo']), ('email', ['a', 'b'])])]
+		self.assertEqual(self.format.dumps(data, changetype='modify'), (
+			b'version: 1\n'
+			b'\n'
+			b'dn: cn=foo\n'
+			b'changetype: modify\n'
+			b'replace: cn\n'
+			b'cn: foo\n'
+			b'-\n'
+			b'replace: mail\n'
+			b'mail: a\n'
+			b'mail: b\n'
+			b'-\n'))
+		self.assertEqual(self.format.dumps(data, changetype='delete'), (
+			b'version: 1\n'
+			b'\n'
+			b'dn: cn=foo\n'
+			b'changetype: delete\n'))
+		with self.assertRaises(ValueError):
+			self.format.dumps(data, changetype='moddn')
+
+	def test_load_syntax(self):
+		text = (
+			b'version: 1\r\n'
+			b'# a comment\r\n'
+			b' that is folded\r\n'
+			b'dn: cn=foo,dc=example,dc=com\r\n'
+			b'objectClass: inetOrgPerson\r\n'
+			b'cn;lang-de: f\r\n'
+			b' oo\r\n'
+			b'telephoneNumber: 123\r\n'
+			b'O: Example\r\n'
+			b'jpegPhoto:: this is not base64\r\n'
+			b' and would fail to decode\r\n'
+			b'jpegPhoto:< file:///tmp/foo.jpg\r\n'
+			b'\r\n'
+			b'dn: cn=bar,dc=example,dc=com\r\n'
+			b'cn: bar\r\n')
+		self.assertEqual(list(self.format.loads(text)), [
+			cctool.MultiDict([
+				('name', ['foo']),
+				('workphone', ['123']),
+				('org', ['Example']),
+			]),
+			cctool.MultiDict([('name', ['bar'])]),
+		])
+
+	def test_load_stream(self):
+		def lines():
+			yield b'dn: cn=foo\n'
+			yield b'cn: foo\n'
+			yield b'\n'
+			raise AssertionError('read too far')
+
+		item = next(self.format.load(lines()))
+		self.assertEqual(item, cctool.MultiDict([('name', ['foo'])]))
+
+	def test_split(self):
+		self.assertSplit(b'dn: a\ncn: a\n b\n\ndn: c\ncn: c\n\n')
+
+
+class TestVCard(_TestFormat):
+	def setUp(self):
+		self.format = cctool.VCard()
+		self.text = b'BEGIN:VCARD\r\nVERSION:3.0\r\nFN:foo\r\nN:foo;;;;\r\nEND:VCARD\r\n'
+
+	def test_load_syntax(self):
+		text = (
+			b'BEGIN:VCARD\r\n'
+			b'VERSION:2.1\r\n'
+			b'FN;CHARSET=UTF-8;ENCODING=QUOTED-PRINTABLE:K=C3=B6=\r\n'
+			b'nig\r\n'
+			b'TEL;CELL:123\r\n'
+			b'TEL;WORK;VOICE:456\r\n'
+			b'TEL;FAX:789\r\n'
+			b'item1.EMAIL;type=INTERNET:foo@example.com\r\n'
+			b'ADR;TYPE=home:;;Street 1\\nFloor 2;City;;12345;DE\r\n'
+			b'BDAY:--0521\r\n'
+			b'NOTE:a\\, b\r\n'
+			b'  c\r\n'
+			b'PHOTO;ENCODING=b:not base64\r\n'
+			b' and would fail to decode\r\n'
+			b'END:VCARD\r\n'
+			b'BEGIN:VCARD\n'
+			b'VERSION:4.0\n'
+			b'FN:bar\n'
+			b'TEL;VALUE=uri;TYPE="voice,home":tel:+1\n'
+			b'BDAY:19800102\n'
+			b'IMPP:xmpp:bar@example.com\n'
+			b'IMPP:sip:bar@example.com\n'
+			b'CATEGORIES:a,b\\,c\n'
+			b'END:VCARD\n')
+		self.assertEqual(list(self.format.loads(text)), [
+			cctool.MultiDict([
+				('name', [u'K\xf6nig']),
+				('mobile', ['123']),
+				('workphone', ['456']),
+				('email', ['foo@example.com']),
+				('address_lines', ['Street 1', 'Floor 2']),
+				('city', ['City']),
+				('zip', ['12345']),
+				('country', ['DE']),
+				('bday', [datetime(1900, 5, 21)]),
+				('comment', ['a, b c']),
+			]),
+			cctool.MultiDict([
+				('name', ['bar']),
+				('phone', ['+1']),
+				('bday', [datetime(1980, 1, 2)]),
+				('xmpp', ['bar@example.com']),
+				('tag', ['a', 'b,c']),
+			]),
+		])
+
+	def test_load_structured_name(self):
+		text = (
+			b'BEGIN:VCARD\r\n'
+			b'VERSION:2.1\r\n'
+			b'N:Doe;John;;;\r\n'
+			b'END:VCARD\r\n'
+			b'BEGIN:VCARD\r\n'
+			b'N:Doe;John;;;\r\n'
+			b'FN:Dr. John Doe\r\n'
+			b'END:VCARD\r\n'
+			b'BEGIN:VCARD\r\n'
+			b'N:;;;;\r\n'
+			b'END:VCARD\r\n')
+		self.assertEqual(list(self.format.loads(text)), [
+			cctool.MultiDict([('name', ['John Doe'])]),
+			cctool.MultiDict([('name', ['Dr. John Doe'])]),
+			cctool.MultiDict(),
+		])
+
+	def test_append(self):
+		data = [
+			cctool.MultiDict([('name', ['foo'])]),
+			cctool.MultiDict([('name', ['bar'])]),
+		]
+		self.assertTrue(self.format.appendable)
+		self.assertEqual(self.format.dumps(data),
+			self.format.dumps(data[:1]) + self.format.dumps(data[1:]))
+
+	def test_load_stream(self):
+		def lines():
+			yield b'BEGIN:VCARD\n'
+			yield b'FN:foo\n'
+			yield b'END:VCARD\n'
+			# one line of lookahead is needed for unfolding
+			yield b'BEGIN:VCARD\n'
+			raise AssertionError('read too far')
+
+		item = next(self.format.load(lines()))
+		self.assertEqual(item, cctool.MultiDict([('name', ['foo'])]))
+
+	def test_dump_roundtrip(self):
+		data = [
+			cctool.MultiDict([
+				('name', ['Foo Bar']),
+				('bday', [datetime(1900, 5, 21)]),
+				('email', ['foo@example.com']),
+				('mobile', ['123']),
+				('address_lines', ['Street 1', 'Floor 2']),
+				('zip', ['12345']),
+				('tag', ['a', 'b,c']),
+				('comment', ['a; b\nc']),
+			]),
+			cctool.MultiDict([('name', [u'\xe4' * 40])]),
+		]
+		text = self.format.dumps(data)
+		self.assertEqual(text.split(b'\r\nN:')[0], (
+			b'BEGIN:VCARD\r\n'
+			b'VERSION:3.0\r\n'
+			b'FN:Foo Bar'))
+		self.assertIn(b'N:Bar;Foo;;;\r\n', text)
+		self.assertIn(b'BDAY:--05-21\r\n', text)
+		self.assertIn(b'ADR;TYPE=HOME:;;Street 1\\nFloor 2;;;12345;\r\n', text)
+		self.assertIn(b'NOTE:a\\; b\\nc\r\n', text)
+		for line in text.split(b'\r\n'):
+			self.assertLessEqual(len(line), 75)
+			line.decode('utf8')
+		self.assertEqual(list(self.format.loads(text)), data)
+
+	def test_split(self):
+		self.assertSplit(
+			b'BEGIN:VCARD\nFN:a\n b\nEND:VCARD\n'
+			b'BEGIN:VCARD\nFN:c\nEND:VCARD\n')
+
+
+class TestCSV(_TestFormat):
+	def setUp(self):
+		self.format = cctool.CSV()
+		fields = cctool.PERSON_FIELDS + cctool.GENERIC_FIELDS
+		self.text = (','.join(fields) + '\r\nfoo' + ',' * (len(fields) - 1)
+			+ '\r\n').encode('ascii')
+
+	def test_load_syntax(self):
+		text = (
+			b'\xef\xbb\xbfName,E-Mail,Birthday,email,Other\r\n'
+			b'foo,"a@example.com,b@example.com",1980-01-02,c@example.com\r\n'
+			b'"multi\nline",,,,x,ignored\r\n')
+		self.assertEqual(list(self.format.loads(text)), [
+			cctool.MultiDict([
+				('name', ['foo']),
+				('email', ['a@example.com', 'b@example.com', 'c@example.com']),
+				('bday', [date(1980, 1, 2)]),
+			]),
+			cctool.MultiDict([
+				('name', ['multi\nline']),
+				('other', ['x']),
+			]),
+		])
+
+	def test_dump(self):
+		class Batched(cctool.CSV):
+			batch_size = 2
+
+		data = [
+			cctool.MultiDict([('name', ['foo']), ('tag', ['a', 'b'])]),
+			cctool.MultiDict([('name', ['bar']), ('bday', [dt])]),
+			cctool.MultiDict([('name', ['baz']), ('x', ['dropped'])]),
+			cctool.MultiDict([('email', ['foo@example.com'])]),
+		]
+		stderr = sys.stderr
+		sys.stderr = NativeStringIO()
+		try:
+			text = Batched.dumps(data)
+			warning = sys.stderr.getvalue()
+		finally:
+			sys.stderr = stderr
+
+		lines = text.split(b'\r\n')
+		header = lines[0].decode('ascii').split(',')
+		self.assertEqual(header[:3], ['name', 'tag', 'bday'])
+		self.assertEqual(set(header), set(
+			cctool.PERSON_FIELDS + cctool.GENERIC_FIELDS))
+		self.assertEqual(lines[2].split(b',')[:3],
+			[b'bar', b'', dt.isoformat().encode('ascii')])
+		self.assertIn('x', warning)
+
+		self.assertEqual(list(Batched.loads(text)), [
+			data[0],
+			data[1],
+			cctool.MultiDict([('name', ['baz'])]),
+			data[3],
+		])
+		self.assertEqual(Batched.dumps([]), b'')
+
+	def test_tsv(self):
+		data = [cctool.MultiDict([('x', ['foo bar']), ('y', ['a', 'b'])])]
+		text = cctool.TSV.dumps(data)
+		self.assertEqual(text, b'x\ty\r\nfoo bar\ta,b\r\n')
+		self.assertEqual(list(cctool.TSV.loads(text)), data)
 
 
 class TestJSON(_TestFormat):
@@ -332,6 +1045,30 @@ class TestJSON(_TestFormat):
 		self.format = cctool.JSON()
 		self.text = b'[\n    {\n        "name": [\n            "foo"\n        ]\n    }\n]'
 
+	def test_dump_stream(self):
+		data = [
+			cctool.MultiDict([('name', ['foo']), ('bday', [dt])]),
+			cctool.MultiDict([('name', ['bar'])]),
+		]
+		expected = json.dumps(data, indent=4, cls=cctool.DateTimeJSONEncoder)
+		self.assertEqual(self.format.dumps(iter(data)), expected.encode('utf8'))
+		self.assertEqual(self.format.dumps(iter([])), b'[]')
+
+
+class TestJSONLines(_TestFormat):
+	def setUp(self):
+		self.format = cctool.JSONLines()
+		self.data = [
+			cctool.MultiDict([('name', ['foo']), ('bday', [dt.date()])]),
+			cctool.MultiDict([('summary', ['b\xe4r']), ('dtstart', [dt])]),
+		]
+		self.text = ('{"name":["foo"],"bday":["%i-01-01"]}\n'
+			'{"summary":["b\xe4r"],"dtstart":["%i-01-01T00:00:00"]}\n'
+			% (year, year)).encode('utf8')
+
+	def test_split(self):
+		self.assertSplit(self.text)
+
 
 class TestPickle(_TestFormat):
 	def setUp(self):
@@ -351,19 +1088,346 @@ class TestPickle(_TestFormat):
 		pass
 
 
-@unittest.skipIf(isinstance(cctool.yaml, Exception), 'yaml not available')
+class TestRecords(_TestFormat):
+	def setUp(self):
+		self.format = cctool.Records()
+		self.data = [
+			cctool.MultiDict([('name', ['foo']), ('bday', [date(2000, 1, 2)])]),
+			cctool.MultiDict([('name', ['bar'])]),
+		]
+		self.text = (
+			b'CCREC\x01'
+			b'\x17\x02\x00\x04name\x01\x18foo\x00\x04bday\x01\xc9\xc0\xe4\x02'
+			b'\x07\x01\x01\x01\x18bar'
+			b'\x00'
+			b'\x02\x04name\x04bday'
+			b'\x06\x00\x00\x00\x00\x00\x00\x00\x1e\x00\x00\x00\x00\x00\x00\x00'
+			b'\x27\x00\x00\x00\x00\x00\x00\x00\x32\x00\x00\x00\x00\x00\x00\x00'
+			b'\x02\x00\x00\x00\x00\x00\x00\x00CCRI')
+
+	def test_values(self):
+		tz = cctool.timezone(timedelta(hours=-5))
+		data = [cctool.MultiDict([
+			('x', ['b\xe4r', 'x' * 100, dt, datetime(2000, 1, 2, 3, tzinfo=tz)]),
+			('y', [0, -1, 2 ** 70, 1.5, True, False, None, b'\x00']),
+		]), cctool.MultiDict()]
+		actual = list(self.format.loads(self.format.dumps(data)))
+		self.assertEqual(actual, data)
+		self.assertEqual(actual[0]['x'][3].utcoffset(), timedelta(hours=-5))
+		with self.assertRaises(TypeError):
+			self.format.dumps([cctool.MultiDict({'x': [object()]})])
+
+	def test_stream(self):
+		class Stream(object):
+			def __init__(self, chunks):
+				self.chunks = iter(chunks)
+
+			def read(self, size=-1):
+				return next(self.chunks)
+
+		# the first record is complete after the second read
+		fh = Stream([self.text[:6], self.text[6:32]])
+		self.assertEqual(next(self.format.load(fh)), self.data[0])
+
+	def test_truncated(self):
+		for text in [
+			self.text[:20],
+			b'CCREC\x01\x80',  # cut inside the length
+			b'CCREC\x01\x03\x01\x05\x00',  # unknown key
+			b'CCREC\x01\x04\x01\x00\x85\x80',  # cut inside the key length
+			b'CCREC\x01\x04\x01\x00\x01x',  # no value count
+			# huge time of day
+			b'CCREC\x01\x13\x01\x00\x01x\x01\x82\xe6\xd5\x02'
+			b'\x80\x80\xc0\x98\xd6\xc5\xd7\xe3\xeb\n',
+			# huge day ordinal
+			b'CCREC\x01\x0f\x01\x00\x01x\x01'
+			b'\x81\x80\x80\x80\x80\x80\x80\x80\x80\x10',
+		]:
+			with self.assertRaises(ValueError):
+				list(self.format.loads(text))
+		# garbage record count in the trailer
+		with self.assertRaises(ValueError):
+			cctool.RecordReader(self.text[:-12] + b'\xff' * 8 + b'CCRI')
+
+	def test_no_index(self):
+		fh = BytesIO()
+		self.format.dump(self.data, fh, index=False)
+		self.assertEqual(list(self.format.loads(fh.getvalue())), self.data)
+		with self.assertRaises(ValueError):
+			cctool.RecordReader(fh.getvalue())
+
+	def test_reader(self):
+		reader = cctool.RecordReader(self.text)
+		self.assertEqual(len(reader), 2)
+		self.assertEqual(reader[1], self.data[1])
+		self.assertEqual(reader[-2], self.data[0])
+		self.assertEqual(list(reader), self.data)
+		with self.assertRaises(IndexError):
+			reader[2]
+
+
+@unittest.skipIf(not cctool.has_backend('yaml'), 'yaml not available')
 class TestYAML(_TestFormat):
 	def setUp(self):
 		self.format = cctool.YAML()
 		self.text = b'- name: [foo]\n'
 
 
+class TestMappedFile(unittest.TestCase):
+	def setUp(self):
+		fd, self.filename = tempfile.mkstemp()
+		self.addCleanup(os.remove, self.filename)
+		with os.fdopen(fd, 'wb') as fh:
+			fh.write(b'foo\nbar\n\nbaz')
+
+	def test_read(self):
+		fh = cctool.MappedFile.open(self.filename, 1)
+		self.addCleanup(fh.close)
+		self.assertEqual(fh.read(3), b'oo\n')
+		self.assertEqual(fh.readline(), b'bar\n')
+		self.assertEqual(list(fh), [b'\n', b'baz'])
+		self.assertEqual(fh.read(), b'')
+
+	def test_range(self):
+		fh = cctool.MappedFile.open(self.filename, 4, 9)
+		self.addCleanup(fh.close)
+		self.assertEqual(list(fh), [b'bar\n', b'\n'])
+
+	def test_range_partial_line(self):
+		fh = cctool.MappedFile.open(self.filename, 4, 6)
+		self.addCleanup(fh.close)
+		self.assertEqual(list(fh), [b'ba'])
+		self.assertEqual(fh.read(), b'')
+
+		fh.pos = 0
+		self.assertEqual(fh.readline(), b'foo\n')
+		self.assertEqual(fh.readline(), b'ba')
+		self.assertEqual(fh.readline(), b'')
+
+	def test_split(self):
+		fh = cctool.MappedFile.open(self.filename)
+		self.addCleanup(fh.close)
+		chunks = list(cctool.JSONLines.split(fh, size=2))
+		self.assertEqual(chunks, [b'foo\n', b'bar\n', b'\nbaz'])
+
+
+class TestParseCache(unittest.TestCase):
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.tmpdir)
+		self.cache = cctool.ParseCache(os.path.join(self.tmpdir, 'cache'))
+		self.calls = 0
+
+		self.filenames = []
+		for i in range(2):
+			filename = os.path.join(self.tmpdir, '%i.bsdcal' % i)
+			with open(filename, 'wb') as fh:
+				fh.write(b'01/01\tfoo\n')
+			self.filenames.append(filename)
+
+	def load(self, filename):
+		def _load():
+			self.calls += 1
+			with open(filename, 'rb') as fh:
+				for item in cctool.BSDCal.load(fh):
+					yield item
+		return list(self.cache.load('bsdcal', filename, _load))
+
+	def test_cache(self):
+		expected = self.load(self.filenames[0])
+		self.assertEqual(self.load(self.filenames[0]), expected)
+		self.assertEqual(self.calls, 1)
+		self.assertIn(('bsdcal', self.filenames[0]), self.cache)
+		self.assertNotIn(('ics', self.filenames[0]), self.cache)
+
+	def test_changed(self):
+		self.load(self.filenames[0])
+		with open(self.filenames[0], 'ab') as fh:
+			fh.write(b'01/02\tbar\n')
+		self.assertEqual(len(self.load(self.filenames[0])), 2)
+		self.assertEqual(self.calls, 2)
+
+	def test_concurrent_mkdir(self):
+		makedirs = os.makedirs
+
+		def _makedirs(path):
+			# another worker creates the directory at the same time
+			makedirs(path)
+			raise OSError('File exists')
+
+		self.addCleanup(setattr, os, 'makedirs', makedirs)
+		os.makedirs = _makedirs
+		self.load(self.filenames[0])
+		self.assertIn(('bsdcal', self.filenames[0]), self.cache)
+
+	def test_include(self):
+		filename = os.path.join(self.tmpdir, 'inc.bsdcal')
+		with open(filename, 'wb') as fh:
+			fh.write(b'01/02\tbar\n')
+		with open(self.filenames[0], 'ab') as fh:
+			fh.write(b'#include "inc.bsdcal"\n')
+		self.assertEqual(len(self.load(self.filenames[0])), 2)
+		with open(filename, 'ab') as fh:
+			fh.write(b'01/03\tbaz\n')
+		self.assertEqual(len(self.load(self.filenames[0])), 3)
+		self.assertEqual(self.calls, 2)
+
+	def test_year(self):
+		class NextYear(datetime):
+			@classmethod
+			def today(cls):
+				return datetime(year + 1, 1, 1)
+
+		self.load(self.filenames[0])
+		self.addCleanup(setattr, cctool, 'datetime', cctool.datetime)
+		cctool.datetime = NextYear
+		self.assertNotIn(('bsdcal', self.filenames[0]), self.cache)
+
+	def test_evict(self):
+		self.load(self.filenames[0])
+		size = os.path.getsize(os.path.join(self.cache.path, os.listdir(self.cache.path)[0]))
+		os.utime(os.path.join(self.cache.path, os.listdir(self.cache.path)[0]), (0, 0))
+		self.cache.max_size = size
+		self.load(self.filenames[1])
+		self.assertNotIn(('bsdcal', self.filenames[0]), self.cache)
+		self.assertIn(('bsdcal', self.filenames[1]), self.cache)
+
+
+class TestIterInput(unittest.TestCase):
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.tmpdir)
+
+		self.input = []
+		for i in range(4):
+			filename = os.path.join(self.tmpdir, '%i.bsdcal' % i)
+			with open(filename, 'wb') as fh:
+				fh.write(b'01/0%i\tfoo\n01/0%i*\tbar\n' % (i + 1, i + 1))
+			self.input.append(filename)
+
+	def test_sequential(self):
+		args = cctool.parse_args(self.input)
+		actual = list(cctool.iter_input(args))
+		self.assertEqual(len(actual), 8)
+		self.assertEqual(actual[2]['dtstart'], [datetime(year, 1, 2)])
+
+	def test_parallel(self):
+		expected = list(cctool.iter_input(cctool.parse_args(self.input)))
+		args = cctool.parse_args(['-j', '3'] + self.input)
+		self.assertEqual(list(cctool.iter_input(args)), expected)
+
+	def test_parallel_chunks(self):
+		filename = os.path.join(self.tmpdir, 'large.jsonl')
+		with open(filename, 'wb') as fh:
+			cctool.JSONLines.dump(cctool.iter_input(cctool.parse_args(self.input)), fh)
+		expected = list(cctool.iter_input(cctool.parse_args([filename])))
+
+		split_size = cctool.SPLIT_SIZE
+		cctool.SPLIT_SIZE = 64
+		self.addCleanup(setattr, cctool, 'SPLIT_SIZE', split_size)
+		args = cctool.parse_args(['-j', '3', filename])
+		self.assertEqual(list(cctool.iter_input(args)), expected)
+
+
+class TestBackends(unittest.TestCase):
+	def test_missing_backend(self):
+		self.assertFalse(cctool.has_backend('cctool_missing'))
+		with self.assertRaises(ImportError):
+			cctool.import_backend('cctool_missing')
+		self.assertFalse(cctool.has_backend('cctool_missing'))
+
+
+
+class EntryPointMock(object):
+	def __init__(self, name, cls):
+		self.name = name
+		self.cls = cls
+
+	def load(self):
+		return self.cls
+
+
+class PluginFormat(cctool.Format):
+	kind = 'person'
+
+	@classmethod
+	def dump(cls, data, fh):
+		fh.write(b'plugin')
+
+
+class TestFormats(unittest.TestCase):
+	def setUp(self):
+		self._entry_points = cctool._entry_points
+		self.calls = []
+
+		def entry_points(group):
+			self.calls.append(group)
+			return [EntryPointMock('plugin', PluginFormat)]
+
+		cctool._entry_points = entry_points
+		cctool._plugins = None
+
+	def tearDown(self):
+		cctool._entry_points = self._entry_points
+		cctool._plugins = None
+
+	def test_builtin(self):
+		self.assertIs(cctool.get_format('bsdcal', 'load'), cctool.BSDCal)
+		self.assertIs(cctool.get_format('json', 'dump'), cctool.JSON)
+		self.assertEqual(self.calls, [])
+
+	def test_plugin(self):
+		self.assertIs(cctool.get_format('plugin'), PluginFormat)
+		self.assertIsNone(cctool.get_format('plugin', 'load'))
+		self.assertIsNone(cctool.get_format('unknown'))
+		self.assertEqual(self.calls, ['cctool.formats'])
+
+		informats, outformats = cctool.formats()
+		self.assertNotIn('plugin', informats)
+		self.assertIs(outformats['plugin'], PluginFormat)
+		self.assertIs(outformats['jsonl'], cctool.JSONLines)
+
+	def test_args(self):
+		args = cctool.parse_args(['-t', 'plugin'])
+		self.assertEqual(args.outformat, 'plugin')
+		with self.assertRaises(SystemExit):
+			cctool.parse_args(['-f', 'plugin'])
+
+	def test_capabilities(self):
+		self.assertTrue(cctool.BSDCal.streaming_load)
+		self.assertFalse(cctool.JSON.streaming_load)
+		self.assertFalse(cctool.Pickle.streaming_dump)
+		self.assertEqual(cctool.ABook.kind, 'person')
+		self.assertTrue(cctool.LDIF.implements('dump'))
+		self.assertFalse(cctool.Format.implements('dump'))
+
+	def test_reads_at_once(self):
+		self.assertTrue(cctool._reads_at_once(cctool.parse_args(['a.json'])))
+		self.assertFalse(cctool._reads_at_once(cctool.parse_args(['a.jsonl'])))
+		self.assertFalse(
+			cctool._reads_at_once(cctool.parse_args(['a.json', 'b.json'])))
+		self.assertTrue(
+			cctool._reads_at_once(cctool.parse_args(['-f', 'pickle', 'a'])))
+
+
 class TestArgs(unittest.TestCase):
 	def test_args(self):
 		args = cctool.parse_args(['-f', 'abook', '-t', 'bsdcal'])
 		self.assertEqual(args.informat, 'abook')
 		self.assertEqual(args.outformat, 'bsdcal')
 
+	def test_merge_args(self):
+		args = cctool.parse_args(['-m', 'email:casefold,phone:digits', '-m', 'name'])
+		self.assertEqual(args.merge, [['email:casefold', 'phone:digits'], ['name']])
+
+	def test_ldif_args(self):
+		args = cctool.parse_args(['-t', 'ldif', '--ldif-changetype', 'delete'])
+		self.assertEqual(cctool._dump_kwargs(args, cctool.LDIF),
+			{'dn': 'cn={name}', 'changetype': 'delete'})
+		self.assertEqual(cctool._dump_kwargs(args, cctool.JSON), {})
+		with self.assertRaises(SystemExit):
+			cctool.parse_args(['--ldif-changetype', 'moddn'])
+
 
 class ArgsMock(object):
 	outformat = None